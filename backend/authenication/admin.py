@@ -1,3 +1,70 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.forms import UserChangeForm, UserCreationForm
+from core.pagination import EstimatedCountPaginator
+from .models import AuthToken, CustomUser, OTPVerification
 
-# Register your models here.
+
+class CustomUserCreationForm(UserCreationForm):
+    class Meta(UserCreationForm.Meta):
+        model = CustomUser
+        fields = ('username', 'email', 'phone', 'role')
+
+
+class CustomUserChangeForm(UserChangeForm):
+    class Meta(UserChangeForm.Meta):
+        model = CustomUser
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(UserAdmin):
+    form = CustomUserChangeForm
+    add_form = CustomUserCreationForm
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    list_display = ('username', 'email', 'phone', 'role', 'is_email_verified', 'is_phone_verified', 'is_staff', 'created_at')
+    list_filter = ('role', 'is_staff')
+    ordering = ('-id',)
+    search_fields = ('username', 'email', 'phone')
+    search_help_text = 'Exact username, email or phone number'
+
+    fieldsets = UserAdmin.fieldsets + (
+        ('ODA', {'fields': ('full_name', 'phone', 'role', 'is_email_verified', 'is_phone_verified', 'location_lat', 'location_lng')}),
+    )
+    add_fieldsets = (
+        (None, {
+            'classes': ('wide',),
+            'fields': ('username', 'email', 'phone', 'role', 'password1', 'password2'),
+        }),
+    )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact matches only, each served by a unique index; icontains would scan the table
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if '@' in search_term:
+            return queryset.filter(email__iexact=search_term), False
+        return queryset.filter(username=search_term) | queryset.filter(phone=search_term), False
+
+
+@admin.register(OTPVerification)
+class OTPVerificationAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_display = ('user', 'otp_type', 'contact', 'is_verified', 'created_at', 'expires_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    exclude = ('otp_code',)
+
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_display = ('user', 'device_name', 'created_at', 'last_used_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    readonly_fields = ('key', 'created_at', 'last_used_at')
+    ordering = ('-last_used_at',)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AuthenicationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authenication'
+
+    def ready(self):
+        from . import caching  # noqa: F401
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from .caching import user_cache
+from .models import AuthToken
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication with a sliding expiry.
+
+    Every successful request extends the token's lifetime, but `last_used_at` is
+    written at most once per AUTH_TOKEN_TOUCH_INTERVAL_MINUTES so ordinary
+    requests stay read-only.
+    """
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        try:
+            token = AuthToken.objects.get(key=key)
+        except AuthToken.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        # The user row comes from the two-tier cache, the token itself is always read fresh.
+        # request.user therefore has `password` deferred: reading it costs one query, and save()
+        # without update_fields only writes the loaded fields, so the hash is never overwritten.
+        token.user = user_cache.get_instance(token.user_id)
+        if token.user is None or not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        now = timezone.now()
+        if token.is_expired(now):
+            raise exceptions.AuthenticationFailed('Token has expired.')
+
+        touch_interval = timezone.timedelta(minutes=settings.AUTH_TOKEN_TOUCH_INTERVAL_MINUTES)
+        if now - token.last_used_at >= touch_interval:
+            # Conditional update so concurrent requests on the same token write once
+            AuthToken.objects.filter(
+                pk=token.pk, last_used_at=token.last_used_at
+            ).update(last_used_at=now)
+            token.last_used_at = now
+
+        return (token.user, token)
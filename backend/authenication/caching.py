@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from core.object_cache import ModelCache
+from .models import CustomUser
+
+# Users by id, read on every token-authenticated request. Password hashes stay out of the shared cache.
+user_cache = ModelCache(CustomUser, exclude=['password'])
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from authenication.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired auth tokens in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches to limit load on the database')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # Fix the cutoff up front so tokens expiring mid-run do not keep the loop going
+        expired = AuthToken.objects.filter(last_used_at__lt=AuthToken.expiry_cutoff())
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} expired tokens would be deleted')
+            return
+
+        deleted = 0
+        while True:
+            keys = list(expired.order_by('last_used_at').values_list('pk', flat=True)[:batch_size])
+            if not keys:
+                break
+            with transaction.atomic():
+                # Re-check expiry in case a token was used since it was selected
+                count, _ = expired.filter(pk__in=keys).delete()
+            deleted += count
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens'))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_legacy_tokens(apps, schema_editor):
+    # Keep existing sessions working: legacy tokens start their sliding TTL now
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('authenication', 'AuthToken')
+    now = django.utils.timezone.now()
+    AuthToken.objects.bulk_create(
+        [
+            AuthToken(key=token.key, user_id=token.user_id, device_name='legacy', last_used_at=now)
+            for token in Token.objects.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenication', '0002_customuser_full_name'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('device_name', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_legacy_tokens, migrations.RunPython.noop),
+    ]
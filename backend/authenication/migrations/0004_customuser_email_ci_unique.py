@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:13
+
+import authenication.models
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+
+def check_email_clashes(apps, schema_editor):
+    """Refuse to add the constraint while emails differing only in case exist, and list them"""
+    CustomUser = apps.get_model('authenication', 'CustomUser')
+    clashes = (
+        CustomUser.objects.using(schema_editor.connection.alias).exclude(email='')
+        .values(normalized=Upper('email')).annotate(accounts=Count('id')).filter(accounts__gt=1)
+        .order_by('normalized')
+    )
+    report = [
+        f"  {clash['normalized']}: user ids "
+        + ', '.join(str(pk) for pk in CustomUser.objects.filter(email__iexact=clash['normalized']).values_list('id', flat=True))
+        for clash in clashes
+    ]
+    if report:
+        raise RuntimeError(
+            'Emails that differ only in case must be merged or changed before this migration:\n' + '\n'.join(report)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authenication', '0003_authtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_email_clashes, migrations.RunPython.noop),
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', authenication.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('email'), condition=models.Q(('email', ''), _negated=True), name='customuser_email_ci_unique'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authenication', '0004_customuser_email_ci_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role'], name='customuser_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_staff', True)), fields=['is_staff'], name='customuser_staff_idx'),
+        ),
+    ]
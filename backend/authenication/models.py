@@ -1,6 +1,10 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db.models.functions import Upper
 from django.utils import timezone
+import binascii
+import os
 import random
 import string
 
@@ -11,6 +15,16 @@ class UserRole(models.TextChoices):
     VENDOR = 'vendor', 'Vendor'
     ADMIN = 'admin', 'Admin'
 
+class CustomUserManager(UserManager):
+    @staticmethod
+    def email_match(email):
+        """Case-insensitive email condition, served by the upper(email) unique index"""
+        # The index is partial, repeating its condition lets the planner use it
+        return ~models.Q(email='') & models.Q(email__iexact=email)
+
+    def by_email(self, email):
+        return self.filter(self.email_match(email))
+
 class CustomUser(AbstractUser):
     full_name = models.CharField(max_length=255, blank=True, null=True)  # Added full_name field
     phone = models.CharField(max_length=15, unique=True)
@@ -22,6 +36,23 @@ class CustomUser(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CustomUserManager()
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Matches the UPPER(email) expression Django uses for iexact lookups
+            models.UniqueConstraint(
+                Upper('email'),
+                name='customuser_email_ci_unique',
+                condition=~models.Q(email=''),
+            ),
+        ]
+        indexes = [
+            # Admin changelist filters
+            models.Index(fields=['role'], name='customuser_role_idx'),
+            models.Index(fields=['is_staff'], name='customuser_staff_idx', condition=models.Q(is_staff=True)),
+        ]
+
     def save(self, *args, **kwargs):
         # Auto-populate first_name and last_name from full_name if provided
         if self.full_name and not self.first_name and not self.last_name:
@@ -54,12 +85,49 @@ class OTPVerification(models.Model):
     def is_expired(self):
         return timezone.now() > self.expires_at
 
-    def save(self, *args, **kwargs):
+    def populate_defaults(self):
+        """Fill in code and expiry; also needed for bulk_create, which skips save()"""
         if not self.otp_code:
             self.otp_code = ''.join(random.choices(string.digits, k=6))
         if not self.expires_at:
             self.expires_at = timezone.now() + timezone.timedelta(minutes=5)
+        return self
+
+    def save(self, *args, **kwargs):
+        self.populate_defaults()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"OTP for {self.user.username} - {self.otp_type}"
+
+class AuthToken(models.Model):
+    """API token with a sliding expiry; a user can hold one per device"""
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='auth_tokens')
+    device_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
         super().save(*args, **kwargs)
 
+    @classmethod
+    def generate_key(cls):
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    @classmethod
+    def expiry_cutoff(cls, now=None):
+        """Tokens last used before this moment are expired"""
+        return (now or timezone.now()) - timezone.timedelta(days=settings.AUTH_TOKEN_TTL_DAYS)
+
+    @property
+    def expires_at(self):
+        return self.last_used_at + timezone.timedelta(days=settings.AUTH_TOKEN_TTL_DAYS)
+
+    def is_expired(self, now=None):
+        return self.last_used_at < self.expiry_cutoff(now)
+
     def __str__(self):
-        return f"OTP for {self.user.username} - {self.otp_type}"
\ No newline at end of file
+        return f"Token for {self.user_id} ({self.device_name or 'unnamed device'})"
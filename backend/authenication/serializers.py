@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from .models import CustomUser, OTPVerification
 import re
 
@@ -11,33 +14,59 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['username', 'email', 'phone', 'password', 'password_confirm', 'role', 'full_name']  # Added full_name
-
-    def validate_email(self, value):
-        if CustomUser.objects.filter(email=value).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
-        return value
+        # Uniqueness is checked with one query in validate() instead of a query per field
+        extra_kwargs = {
+            'username': {'validators': [UnicodeUsernameValidator()]},
+            'phone': {'validators': []},
+        }
 
     def validate_phone(self, value):
         # Basic phone validation - you can make this more sophisticated
         phone_pattern = re.compile(r'^\+?1?\d{9,15}$')
         if not phone_pattern.match(value):
             raise serializers.ValidationError("Enter a valid phone number.")
-        
-        if CustomUser.objects.filter(phone=value).exists():
-            raise serializers.ValidationError("A user with this phone number already exists.")
         return value
 
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
             raise serializers.ValidationError("Passwords don't match.")
+
+        username = attrs['username']
+        email = attrs.get('email')
+        phone = attrs['phone']
+
+        lookup = Q(username=username) | Q(phone=phone)
+        if email:
+            lookup |= CustomUser.objects.email_match(email)
+
+        errors = {}
+        for existing_username, existing_email, existing_phone in CustomUser.objects.filter(lookup).values_list('username', 'email', 'phone')[:3]:
+            if existing_username == username:
+                errors['username'] = "A user with that username already exists."
+            if email and existing_email.lower() == email.lower():
+                errors['email'] = "A user with this email already exists."
+            if existing_phone == phone:
+                errors['phone'] = "A user with this phone number already exists."
+        if errors:
+            raise serializers.ValidationError(errors)
         return attrs
 
     def create(self, validated_data):
+        """Create the user and its email/phone OTPs in one transaction"""
         validated_data.pop('password_confirm')
         password = validated_data.pop('password')
         user = CustomUser(**validated_data)
         user.set_password(password)
-        user.save()
+        try:
+            with transaction.atomic():
+                user.save()
+                self.otps = OTPVerification.objects.bulk_create([
+                    OTPVerification(user=user, otp_type='email', contact=user.email).populate_defaults(),
+                    OTPVerification(user=user, otp_type='phone', contact=user.phone).populate_defaults(),
+                ])
+        except IntegrityError:
+            # Lost a race with a concurrent signup; the unique constraints caught it
+            raise serializers.ValidationError("A user with this username, email or phone number already exists.")
         return user
 
 class UserLoginSerializer(serializers.Serializer):
@@ -51,10 +80,7 @@ class UserLoginSerializer(serializers.Serializer):
         # Try to find user by email or phone
         user = None
         if '@' in email_or_phone:
-            try:
-                user = CustomUser.objects.get(email=email_or_phone)
-            except CustomUser.DoesNotExist:
-                pass
+            user = CustomUser.objects.by_email(email_or_phone).first()
         else:
             try:
                 user = CustomUser.objects.get(phone=email_or_phone)
@@ -0,0 +1,301 @@
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from core.testing import isolated_caches
+from .authentication import ExpiringTokenAuthentication
+from .caching import user_cache
+from .models import AuthToken, CustomUser, OTPVerification
+from .serializers import UserRegistrationSerializer
+from .throttling import IPRateThrottle
+
+
+class ThreePerMinute(IPRateThrottle):
+    scope = 'test'
+    rate = '3/min'
+
+
+@isolated_caches
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        self.request = Request(APIRequestFactory().post('/', REMOTE_ADDR='10.0.0.1'))
+
+    def attempt(self, now):
+        throttle = ThreePerMinute()
+        throttle.timer = lambda: now
+        return throttle.allow_request(self.request, None), throttle
+
+    def test_limit_within_one_window(self):
+        self.assertEqual([self.attempt(600 + i)[0] for i in range(3)], [True, True, True])
+        allowed, throttle = self.attempt(610)
+        self.assertFalse(allowed)
+        # Only the next window, 50 seconds away, frees capacity
+        self.assertEqual(throttle.wait(), 50)
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        for i in range(3):
+            self.attempt(600 + i)
+        # Halfway into the next window the previous one still counts as 1.5 requests
+        self.assertEqual([self.attempt(690 + i)[0] for i in range(3)], [True, True, False])
+
+    def test_wait_until_previous_window_decays(self):
+        self.attempt(600)
+        self.attempt(601)
+        self.attempt(602)
+        self.attempt(665)
+        allowed, throttle = self.attempt(666)
+        # 3 * (54 / 60) + 1 >= 3; one more fits once the weight drops to 2/3, at 680
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 14)
+
+    def test_other_clients_are_not_limited(self):
+        for i in range(3):
+            self.attempt(600 + i)
+        throttle = ThreePerMinute()
+        throttle.timer = lambda: 603
+        other = Request(APIRequestFactory().post('/', REMOTE_ADDR='10.0.0.2'))
+        self.assertTrue(throttle.allow_request(other, None))
+
+
+@isolated_caches
+@override_settings(OTP_MAX_FAILED_ATTEMPTS=3)
+class OTPLockoutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@example.com', phone='+251911000001', password='pw'
+        )
+        self.otp = OTPVerification.objects.create(user=user, otp_type='email', contact='buyer@example.com')
+
+    def verify(self, code, contact='buyer@example.com'):
+        return self.client.post(
+            '/api/auth/verify-otp/', {'contact': contact, 'otp_code': code, 'otp_type': 'email'}, format='json'
+        )
+
+    def wrong_code(self):
+        return '000000' if self.otp.otp_code != '000000' else '111111'
+
+    def test_locked_out_after_max_failures(self):
+        for _ in range(3):
+            self.assertEqual(self.verify(self.wrong_code()).status_code, 400)
+
+        # Even the right code is refused, for any spelling of the contact
+        response = self.verify(self.otp.otp_code, contact=' Buyer@Example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(15 * 60))
+        self.otp.refresh_from_db()
+        self.assertFalse(self.otp.is_verified)
+
+    def test_success_resets_failures(self):
+        for _ in range(2):
+            self.verify(self.wrong_code())
+        self.assertEqual(self.verify(self.otp.otp_code).status_code, 200)
+
+        for _ in range(2):
+            self.assertEqual(self.verify(self.wrong_code()).status_code, 400)
+        self.assertEqual(self.verify(self.wrong_code()).status_code, 400)
+        self.assertEqual(self.verify(self.wrong_code()).status_code, 429)
+
+
+@isolated_caches
+class AuthTokenTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@example.com', phone='+251911000001', password='pw',
+            is_email_verified=True,
+        )
+        self.client = APIClient()
+
+    def login(self, device):
+        response = self.client.post(
+            '/api/auth/login/', {'email_or_phone': 'buyer@example.com', 'password': 'pw', 'device_name': device},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['token']
+
+    def post(self, path, token):
+        return self.client.post(path, HTTP_AUTHORIZATION=f'Token {token}')
+
+    def test_expired_token_is_rejected(self):
+        token = AuthToken.objects.create(user=self.user)
+        AuthToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now() - timezone.timedelta(days=31))
+
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token has expired.'):
+            ExpiringTokenAuthentication().authenticate_credentials(token.key)
+        self.assertEqual(self.post('/api/auth/refresh/', token.key).status_code, 401)
+
+    def test_use_slides_the_expiry_at_most_once_per_interval(self):
+        token = AuthToken.objects.create(user=self.user)
+        recently = timezone.now() - timezone.timedelta(minutes=5)
+        AuthToken.objects.filter(pk=token.pk).update(last_used_at=recently)
+
+        ExpiringTokenAuthentication().authenticate_credentials(token.key)
+        token.refresh_from_db()
+        self.assertEqual(token.last_used_at, recently)
+
+        AuthToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now() - timezone.timedelta(days=29))
+        before = timezone.now()
+        ExpiringTokenAuthentication().authenticate_credentials(token.key)
+        token.refresh_from_db()
+        self.assertGreaterEqual(token.last_used_at, before)
+
+    def test_logout_revokes_only_that_device(self):
+        phone = self.login('phone')
+        laptop = self.login('laptop')
+
+        self.assertEqual(self.post('/api/auth/logout/', phone).status_code, 200)
+
+        self.assertEqual(self.post('/api/auth/logout/', phone).status_code, 401)
+        self.assertEqual(list(AuthToken.objects.values_list('key', flat=True)), [laptop])
+
+    def test_refresh_revokes_the_old_token(self):
+        old = self.login('phone')
+        response = self.post('/api/auth/refresh/', old)
+        self.assertEqual(response.status_code, 200)
+        new = response.data['token']
+
+        self.assertEqual(self.post('/api/auth/refresh/', old).status_code, 401)
+        self.assertEqual(AuthToken.objects.get().key, new)
+        self.assertEqual(AuthToken.objects.get().device_name, 'phone')
+
+    def test_inactive_user_is_rejected(self):
+        token = self.login('phone')
+        ExpiringTokenAuthentication().authenticate_credentials(token)  # user is now cached
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertEqual(self.post('/api/auth/refresh/', token).status_code, 401)
+
+    def test_purge_deletes_only_expired_tokens(self):
+        fresh = AuthToken.objects.create(user=self.user)
+        stale = AuthToken.objects.create(user=self.user)
+        AuthToken.objects.filter(pk=stale.pk).update(last_used_at=timezone.now() - timezone.timedelta(days=31))
+
+        call_command('purge_expired_tokens', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(list(AuthToken.objects.values_list('key', flat=True)), [fresh.key])
+
+
+@isolated_caches
+class RegistrationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        CustomUser.objects.create_user(
+            username='taken', email='Taken@Example.com', phone='+251911000001', password='pw'
+        )
+
+    def register(self, **overrides):
+        data = {
+            'username': 'newbuyer', 'email': 'new@example.com', 'phone': '+251911000002',
+            'password': 'Sturdy-pass-42', 'password_confirm': 'Sturdy-pass-42', 'role': 'consumer',
+        }
+        return self.client.post('/api/auth/register/', {**data, **overrides}, format='json')
+
+    def test_duplicates_are_reported_per_field(self):
+        response = self.register(username='taken', email='TAKEN@example.COM', phone='+251911000001')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'username', 'email', 'phone'})
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_uniqueness_is_checked_in_one_query(self):
+        CustomUser.objects.filter(username='taken').update(email='')
+        with CaptureQueriesContext(connection) as queries:
+            serializer = UserRegistrationSerializer(data={
+                'username': 'newbuyer', 'email': 'new@example.com', 'phone': '+251911000002',
+                'password': 'Sturdy-pass-42', 'password_confirm': 'Sturdy-pass-42', 'role': 'consumer',
+            })
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        self.assertEqual(len(queries), 1)
+        # The email condition repeats the partial index's predicate
+        self.assertIn('''NOT ("authenication_customuser"."email" = '')''', queries[0]['sql'])
+
+    def test_creates_user_and_both_otps_with_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register()
+
+        self.assertEqual(response.status_code, 201)
+        otp_inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "authenication_otpverification"')]
+        self.assertEqual(len(otp_inserts), 1)
+        self.assertEqual(
+            sorted(OTPVerification.objects.values_list('otp_type', 'contact')),
+            [('email', 'new@example.com'), ('phone', '+251911000002')],
+        )
+
+    def test_race_lost_to_unique_constraint_is_a_400(self):
+        # A concurrent signup that committed after validate() ran
+        with mock.patch.object(UserRegistrationSerializer, 'validate', lambda self, attrs: attrs):
+            response = self.register(email='taken@EXAMPLE.com')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already exists', response.data[0])
+        self.assertEqual(CustomUser.objects.count(), 1)
+        self.assertFalse(OTPVerification.objects.exists())
+
+
+@isolated_caches
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='buyer', email='buyer@example.com', phone='+251911000001', password='pw',
+        )
+        self.now = 1000.0
+        clock = mock.patch('core.object_cache.time.monotonic', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.enterContext(mock.patch.dict(user_cache.stats, dict.fromkeys(user_cache.stats, 0)))
+
+    def cached_name(self):
+        return user_cache.get_instance(self.user.pk).first_name
+
+    def test_invalidation_is_applied_after_commit(self):
+        self.assertEqual(self.cached_name(), '')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Abebe'
+            self.user.save()
+            # Until commit, other readers must not load and cache the uncommitted row
+            self.assertEqual(self.cached_name(), '')
+        self.assertEqual(self.cached_name(), 'Abebe')
+        self.assertEqual(user_cache.stats['invalidations'], 1)
+
+    def test_rolled_back_save_does_not_invalidate(self):
+        self.cached_name()
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.user.first_name = 'Abebe'
+                self.user.save()
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+
+    def test_password_is_not_cached(self):
+        user = user_cache.get_instance(self.user.pk)
+        self.assertNotIn('password', user.__dict__)
+        self.assertTrue(user.check_password('pw'))
+
+    def test_other_workers_refetch_within_local_ttl(self):
+        self.cached_name()
+        # Another worker saves the row: the shared version changes, this worker's local copy does not
+        CustomUser.objects.filter(pk=self.user.pk).update(first_name='Abebe')
+        user_cache._shared().set(user_cache._version_key(self.user.pk), 'remote', None)
+
+        self.assertEqual(self.cached_name(), '')
+        self.now += settings.OBJECT_CACHE_LOCAL_TTL + 1
+        self.assertEqual(self.cached_name(), 'Abebe')
+
+    def test_expired_local_copy_is_revalidated_without_reloading(self):
+        self.cached_name()
+        self.now += settings.OBJECT_CACHE_LOCAL_TTL + 1
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cached_name(), '')
+        self.assertEqual(user_cache.stats['revalidations'], 1)
@@ -0,0 +1,182 @@
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+
+def normalize_contact(value):
+    """Normalize an email/phone so that case and whitespace variants share a counter"""
+    return ''.join(str(value).split()).lower()
+
+
+def body_value(request, field):
+    """A field of the request body, or None when the body is not an object (the serializer rejects it with a 400)"""
+    if not isinstance(request.data, dict):
+        return None
+    return request.data.get(field)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Sliding window counter throttle.
+
+    Instead of storing the full request history (like DRF's SimpleRateThrottle)
+    it keeps one integer per fixed window and weights the previous window by the
+    portion that still overlaps the sliding window. That is two small cache
+    operations per allowed request and no pickled lists.
+    """
+    cache_format = 'rl:%(scope)s:%(ident)s'
+
+    @property
+    def cache(self):
+        return caches[settings.RATELIMIT_CACHE]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+
+        cache = self.cache
+        counts = cache.get_many([current_key, previous_key])
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+
+        elapsed = self.now - window * self.duration
+        weight = (self.duration - elapsed) / self.duration
+        if previous * weight + current >= self.num_requests:
+            self._wait = self._compute_wait(previous, current, elapsed)
+            return False
+
+        # The window key must outlive the next window so it can be weighted in
+        if not cache.add(current_key, 1, self.duration * 2):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                cache.set(current_key, 1, self.duration * 2)
+        return True
+
+    def _compute_wait(self, previous, current, elapsed):
+        remaining = self.duration - elapsed
+        if current >= self.num_requests or previous == 0:
+            # Only the next window will free up capacity
+            return remaining
+        # Time until previous * weight + current drops below the limit and admits one more
+        decay = remaining - (self.num_requests - current) * self.duration / previous
+        return min(max(decay, 1), remaining)
+
+    def wait(self):
+        return math.ceil(getattr(self, '_wait', self.duration))
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """Limit a scope per client IP"""
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+class ContactRateThrottle(SlidingWindowThrottle):
+    """Limit a scope per email/phone taken from the request body"""
+    contact_field = 'contact'
+
+    def get_cache_key(self, request, view):
+        contact = body_value(request, self.contact_field)
+        if not contact:
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': normalize_contact(contact),
+        }
+
+
+class LoginIPThrottle(IPRateThrottle):
+    scope = 'login_ip'
+
+
+class LoginContactThrottle(ContactRateThrottle):
+    scope = 'login_contact'
+    contact_field = 'email_or_phone'
+
+
+class RegisterIPThrottle(IPRateThrottle):
+    scope = 'register_ip'
+
+
+class RegisterContactThrottle(ContactRateThrottle):
+    scope = 'register_contact'
+    contact_field = 'email'
+
+
+class OTPVerifyIPThrottle(IPRateThrottle):
+    scope = 'otp_verify_ip'
+
+
+class OTPVerifyContactThrottle(ContactRateThrottle):
+    scope = 'otp_verify_contact'
+
+
+class OTPResendIPThrottle(IPRateThrottle):
+    scope = 'otp_resend_ip'
+
+
+class OTPResendContactThrottle(ContactRateThrottle):
+    scope = 'otp_resend_contact'
+
+
+# OTP lockout
+
+def _lockout_keys(contact):
+    contact = normalize_contact(contact)
+    return f'rl:otp_failures:{contact}', f'rl:otp_lockout:{contact}'
+
+
+def record_otp_failure(contact):
+    """Count a failed OTP attempt and lock the contact once the limit is reached"""
+    cache = caches[settings.RATELIMIT_CACHE]
+    failures_key, lockout_key = _lockout_keys(contact)
+    lockout_seconds = settings.OTP_LOCKOUT_SECONDS
+
+    if cache.add(failures_key, 1, lockout_seconds):
+        failures = 1
+    else:
+        try:
+            failures = cache.incr(failures_key)
+        except ValueError:
+            cache.set(failures_key, 1, lockout_seconds)
+            failures = 1
+
+    if failures >= settings.OTP_MAX_FAILED_ATTEMPTS:
+        cache.set(lockout_key, True, lockout_seconds)
+        cache.delete(failures_key)
+    return failures
+
+
+def reset_otp_failures(contact):
+    """Clear the failure counter after a successful verification"""
+    caches[settings.RATELIMIT_CACHE].delete_many(_lockout_keys(contact))
+
+
+class OTPLockoutThrottle(BaseThrottle):
+    """Reject every OTP attempt for a contact that is locked out"""
+
+    def allow_request(self, request, view):
+        contact = body_value(request, 'contact')
+        if not contact:
+            return True
+        _, lockout_key = _lockout_keys(contact)
+        return not caches[settings.RATELIMIT_CACHE].get(lockout_key)
+
+    def wait(self):
+        return settings.OTP_LOCKOUT_SECONDS
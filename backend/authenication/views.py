@@ -1,12 +1,13 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from .models import CustomUser, OTPVerification
+from core.idempotency import idempotent
+from .models import AuthToken, CustomUser, OTPVerification
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
@@ -14,32 +15,36 @@ from .serializers import (
     ResendOTPSerializer,
     UserSerializer
 )
+from .throttling import (
+    LoginIPThrottle,
+    LoginContactThrottle,
+    RegisterIPThrottle,
+    RegisterContactThrottle,
+    OTPVerifyIPThrottle,
+    OTPVerifyContactThrottle,
+    OTPResendIPThrottle,
+    OTPResendContactThrottle,
+    OTPLockoutThrottle,
+    record_otp_failure,
+    reset_otp_failures,
+    body_value,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([RegisterIPThrottle, RegisterContactThrottle])
+@idempotent
 def register_user(request):
     """Register a new user and send OTP for verification"""
     serializer = UserRegistrationSerializer(data=request.data)
     
     if serializer.is_valid():
+        # Creates the user and both OTPs atomically
         user = serializer.save()
-        
-        # Create OTP for email verification
-        email_otp = OTPVerification.objects.create(
-            user=user,
-            otp_type='email',
-            contact=user.email
-        )
-        
-        # Create OTP for phone verification
-        phone_otp = OTPVerification.objects.create(
-            user=user,
-            otp_type='phone',
-            contact=user.phone
-        )
+        email_otp, phone_otp = serializer.otps
         
         # Send email OTP (in development, this will print to console)
         try:
@@ -68,6 +73,7 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([LoginIPThrottle, LoginContactThrottle])
 def login_user(request):
     """Login user with email/phone and password"""
     serializer = UserLoginSerializer(data=request.data)
@@ -81,7 +87,11 @@ def login_user(request):
                 'error': 'Please verify your email or phone number before logging in.'
             }, status=status.HTTP_401_UNAUTHORIZED)
         
-        token, created = Token.objects.get_or_create(user=user)
+        # One token per login so each device can be logged out independently
+        token = AuthToken.objects.create(
+            user=user,
+            device_name=str(request.data.get('device_name', ''))[:255]
+        )
         
         return Response({
             'token': token.key,
@@ -93,6 +103,7 @@ def login_user(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([OTPLockoutThrottle, OTPVerifyIPThrottle, OTPVerifyContactThrottle])
 def verify_otp(request):
     """Verify OTP for email or phone"""
     serializer = OTPVerificationSerializer(data=request.data)
@@ -101,6 +112,7 @@ def verify_otp(request):
         otp = serializer.validated_data['otp']
         otp.is_verified = True
         otp.save()
+        reset_otp_failures(otp.contact)
         
         # Update user verification status
         user = otp.user
@@ -114,10 +126,17 @@ def verify_otp(request):
             'message': f'{otp.otp_type.title()} verified successfully'
         }, status=status.HTTP_200_OK)
     
+    # Count wrong codes so six digits cannot be brute-forced
+    contact = body_value(request, 'contact')
+    if contact:
+        record_otp_failure(contact)
+    
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([OTPResendIPThrottle, OTPResendContactThrottle])
+@idempotent
 def resend_otp(request):
     """Resend OTP for email or phone"""
     serializer = ResendOTPSerializer(data=request.data)
@@ -129,9 +148,8 @@ def resend_otp(request):
         # Find user by contact
         user = None
         if otp_type == 'email':
-            try:
-                user = CustomUser.objects.get(email=contact)
-            except CustomUser.DoesNotExist:
+            user = CustomUser.objects.by_email(contact).first()
+            if user is None:
                 return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         elif otp_type == 'phone':
             try:
@@ -171,11 +189,11 @@ def resend_otp(request):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def refresh_token(request):
-    """Refresh user token"""
-    user = request.user
-    token = Token.objects.get(user=user)
-    token.delete()
-    new_token = Token.objects.create(user=user)
+    """Rotate the token used for this request"""
+    old_token = request.auth
+    with transaction.atomic():
+        new_token = AuthToken.objects.create(user=request.user, device_name=old_token.device_name)
+        old_token.delete()
     
     return Response({
         'token': new_token.key,
@@ -184,15 +202,14 @@ def refresh_token(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent
 def logout_user(request):
-    """Logout user by deleting token"""
-    try:
-        token = Token.objects.get(user=request.user)
-        token.delete()
+    """Logout the current device by deleting its token"""
+    deleted, _ = AuthToken.objects.filter(pk=request.auth.pk).delete()
+    if deleted:
         return Response({
             'message': 'Logout successful'
         }, status=status.HTTP_200_OK)
-    except Token.DoesNotExist:
-        return Response({
-            'message': 'User is already logged out'
-        }, status=status.HTTP_200_OK)
+    return Response({
+        'message': 'User is already logged out'
+    }, status=status.HTTP_200_OK)
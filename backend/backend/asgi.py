@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Read by settings: persistent DB connections are disabled under ASGI
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
+
+# Pay for URL resolution, serializer fields and DB connections before the first request
+if settings.WARMUP_ON_STARTUP:
+    from core.warmup import warmup
+    warmup()
+
+# Document uploads are streamed by vendors.direct_upload, outside the Django middleware stack
+from vendors.direct_upload import with_direct_uploads
+application = with_direct_uploads(application)
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,11 +26,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'core',
     'authenication',
     'vendors',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ConcurrencyLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,6 +40,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.query_stats.QueryStatsMiddleware',
+    'core.profiling.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -70,6 +75,9 @@ DATABASES = {
         'PASSWORD': '123456789',
         'HOST': 'localhost',  # or your database host
         'PORT': '5432',       # default PostgreSQL port
+        # Keep connections open across requests under WSGI; asgi.py sets DJANGO_ASGI, where Django advises against it
+        'CONN_MAX_AGE': 0 if os.environ.get('DJANGO_ASGI') else 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -117,7 +125,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'authenication.authentication.ExpiringTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -125,8 +133,119 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
+    # Sliding window limits used by authenication.throttling
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_contact': '10/min',
+        'register_ip': '10/hour',
+        'register_contact': '3/hour',
+        'otp_verify_ip': '30/min',
+        'otp_verify_contact': '10/min',
+        'otp_resend_ip': '10/hour',
+        'otp_resend_contact': '5/hour',
+    },
+}
+
+# Cache Configuration
+# Local memory is per process and file caches are per host; point these at Redis/Memcached for multi-node deployments
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'oda-default',
+    },
+    # Rate limit counters and OTP lockouts, shared by every worker on the host (atomic add/incr)
+    'ratelimit': {
+        'BACKEND': 'core.cache_backends.LockedFileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'ratelimit',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Idempotency-Key locks and stored responses, shared by every worker on the host (atomic add)
+    'idempotency': {
+        'BACKEND': 'core.cache_backends.LockedFileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'idempotency',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Per-route profiler aggregates, written by every worker and read by `manage.py profile_report`
+    'profiler': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'profiler',
+    },
+    # Public directory pages and their version token, shared so an invalidation reaches every worker
+    'directory': {
+        'BACKEND': 'core.cache_backends.LockedFileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'directory',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Shared tier of core.object_cache; file based so local workers share it, use Redis/Memcached in production
+    'objects': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'objects',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
+# Object Cache Configuration
+OBJECT_CACHE = 'objects'
+OBJECT_CACHE_LOCAL_MAX_ENTRIES = 10000  # per worker process
+OBJECT_CACHE_LOCAL_TTL = 5  # seconds a worker trusts its local copy; bounds stale reads across workers
+OBJECT_CACHE_SHARED_TTL = 10 * 60
+
+# Worker Warmup Configuration
+WARMUP_ON_STARTUP = True  # run core.warmup when wsgi.py/asgi.py is loaded
+WARMUP_SERIALIZER_MODULES = ['authenication.serializers', 'vendors.serializers']
+
+# Request Profiler Configuration
+PROFILER_SAMPLE_RATE = 0.001  # fraction of all requests merged into the per-route aggregate
+PROFILER_INTERVAL_MS = 5  # stack sampling interval
+PROFILER_TOKEN_MAX_AGE = 60 * 60  # seconds a `profile_token` stays valid
+PROFILER_OUTPUT_DIR = BASE_DIR / 'profiles'
+PROFILER_CACHE = 'profiler'  # must be shared by all processes, profile_report runs in its own
+PROFILER_AGGREGATE_HOURS = 24  # how long hourly per-route aggregates are kept
+PROFILER_MAX_STACKS = 2000  # distinct stacks kept per route and hour
+
+# Query Stats Configuration
+QUERY_STATS_ENABLED = True
+QUERY_STATS_SLOW_MS = 100  # statements slower than this get their EXPLAIN plan captured
+QUERY_STATS_FLUSH_SECONDS = 30  # how often each process upserts its totals
+QUERY_STATS_QUEUE_SIZE = 100  # pending background flush/EXPLAIN tasks; extra ones are dropped
+
+# Concurrency Limit Configuration
+CONCURRENCY_MAX_IN_FLIGHT = 32  # per worker process, shared by all route classes
+CONCURRENCY_CLASSES = {
+    # share: fraction of CONCURRENCY_MAX_IN_FLIGHT the class may fill, lower classes are shed first
+    'auth': {'share': 1.0, 'initial_limit': 16, 'min_limit': 4, 'max_limit': 32},
+    'status': {'share': 1.0, 'initial_limit': 16, 'min_limit': 4, 'max_limit': 32},
+    'default': {'share': 0.8, 'initial_limit': 12, 'min_limit': 2, 'max_limit': 24},
+    'bulk': {'share': 0.5, 'initial_limit': 4, 'min_limit': 1, 'max_limit': 12},
+}
+CONCURRENCY_ROUTE_CLASSES = {
+    # URL name or namespace -> class; anything else is 'default'
+    'register': 'auth',
+    'login': 'auth',
+    'verify_otp': 'auth',
+    'resend_otp': 'auth',
+    'refresh_token': 'auth',
+    'logout': 'auth',
+    'business_verification_status': 'status',
+    'business_directory': 'status',
+    'vendor_map_tile': 'status',
+    'upload_business_documents': 'bulk',
+    'admin': 'bulk',
+}
+CONCURRENCY_WINDOW_SAMPLES = 20  # requests per limit adjustment
+CONCURRENCY_LATENCY_TOLERANCE = 1.5  # latency growth over the baseline accepted before shrinking
+CONCURRENCY_LIMIT_SMOOTHING = 0.2
+CONCURRENCY_BASELINE_SMOOTHING = 0.05
+CONCURRENCY_RETRY_AFTER_SECONDS = 2
+
+# Rate Limiting Configuration
+RATELIMIT_CACHE = 'ratelimit'  # must be shared by every worker, or each one enforces its own limits
+
+# Idempotency-Key Configuration
+IDEMPOTENCY_CACHE = 'idempotency'
+IDEMPOTENCY_TTL = 24 * 60 * 60  # how long a stored response can be replayed
+IDEMPOTENCY_LOCK_TIMEOUT = 30  # seconds a duplicate waits for the first request
+
 # Email Configuration (for OTP)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'  # For production
 EMAIL_HOST = 'smtp.gmail.com'
@@ -143,10 +262,108 @@ DEFAULT_FROM_EMAIL = 'testorder1245@gmail.com'
 # OTP Configuration
 OTP_EXPIRY_MINUTES = 5
 OTP_LENGTH = 6
+OTP_MAX_FAILED_ATTEMPTS = 5
+OTP_LOCKOUT_SECONDS = 15 * 60
+
+# Auth Token Configuration
+AUTH_TOKEN_TTL_DAYS = 30  # sliding: counted from the token's last use
+AUTH_TOKEN_TOUCH_INTERVAL_MINUTES = 15  # how often last_used_at is written
 
 # File Upload Configuration
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Business document limits, keyed by BusinessDocument.document_type ('default' applies to all)
+DOCUMENT_UPLOAD_LIMITS = {
+    'default': {
+        'max_size': 10 * 1024 * 1024,
+        'formats': ['pdf', 'jpeg', 'png'],
+        'max_pages': 20,
+        'min_image_side': 300,
+        'max_image_pixels': 50_000_000,
+    },
+    'business_license': {'max_pages': 5},
+    'tin_certificate': {'max_size': 5 * 1024 * 1024, 'max_pages': 2},
+    'other': {'max_size': 20 * 1024 * 1024, 'max_pages': 50},
+}
+DOCUMENT_VALIDATION_WORKERS = 2
+DOCUMENT_VALIDATION_TIMEOUT = 10  # seconds
+
+# Direct Upload Configuration
+DIRECT_UPLOAD_PATH = '/uploads/'  # served by vendors.direct_upload from asgi.py only
+DIRECT_UPLOAD_BASE_URL = None  # e.g. a dedicated upload host; defaults to the API host
+DIRECT_UPLOAD_URL_TTL = 15 * 60  # seconds a signed upload URL stays valid
+DIRECT_UPLOAD_MAX_CONCURRENCY = 32  # uploads streamed at once per ASGI process
+
+# Document Review Configuration
+REQUIRED_DOCUMENT_TYPES = ['business_license', 'tin_certificate']  # needed for auto-approval
+DOCUMENT_REVIEW_MAX_BATCH = 500
+
+# Public Directory Configuration
+DIRECTORY_CACHE = 'directory'
+DIRECTORY_CACHE_TTL = 5 * 60
+DIRECTORY_PAGE_SIZE = 20
+DIRECTORY_MAX_PAGE_SIZE = 50
+
+# Vendor Map Configuration
+MAP_TILE_MAX_ZOOM = 16
+MAP_CELL_SHIFT = 3  # each tile is split into 2**3 x 2**3 cluster cells
+MAP_TILE_CACHE_SECONDS = 60
+
+# Webhook Configuration
+WEBHOOK_MAX_CONCURRENCY = 8  # parallel requests (and idle keep-alive connections per host)
+WEBHOOK_BATCH_SIZE = 50  # events per POST to one endpoint
+WEBHOOK_DISPATCH_LIMIT = 500  # deliveries claimed per dispatch round
+WEBHOOK_TIMEOUT_SECONDS = 10
+WEBHOOK_CLAIM_SECONDS = 60
+WEBHOOK_MAX_ATTEMPTS = 10
+WEBHOOK_RETRY_BASE_SECONDS = 10
+WEBHOOK_RETRY_MAX_SECONDS = 60 * 60
+WEBHOOK_POLL_SECONDS = 2
+
+# Reviewer Queue Configuration
+REVIEW_LEASE_MINUTES = 15
+REVIEW_QUEUE_MAX_CLAIM = 20
+
 # Custom User Model
 AUTH_USER_MODEL = 'authenication.CustomUser'
+
+# Retention Configuration
+RETENTION_POLICIES = {
+    # Applied in this order by `manage.py apply_retention`
+    'rejected_businesses': {
+        'model': 'vendors.BusinessProfile',
+        'filter': {'verification_status': 'rejected'},
+        'age_field': 'updated_at',
+        'older_than_days': 180,
+        'archive': 'table',
+        # Archived and their files removed in the business's own batch, never left to the cascade
+        'children': [
+            {'relation': 'documents', 'archive': 'ndjson', 'file_fields': ['document_file']},
+        ],
+    },
+    'expired_otps': {
+        'model': 'authenication.OTPVerification',
+        'age_field': 'expires_at',
+        'older_than_days': 7,
+        'archive': None,
+    },
+    'unverified_users': {
+        # Accounts that never completed verify_otp
+        'model': 'authenication.CustomUser',
+        'filter': {
+            'is_email_verified': False, 'is_phone_verified': False, 'is_staff': False, 'businessprofile__isnull': True,
+        },
+        'age_field': 'date_joined',
+        'older_than_days': 30,
+        'archive': 'table',
+        'exclude_fields': ['password'],
+    },
+}
+RETENTION_BATCH_SIZE = 500
+RETENTION_DUTY_CYCLE = 0.2  # fraction of time spent in batches, the rest is sleep so live traffic keeps priority
+RETENTION_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+# Admin Configuration
+# Changelists above this many (estimated) rows show the planner estimate instead of COUNT(*)
+ADMIN_EXACT_COUNT_THRESHOLD = 10000
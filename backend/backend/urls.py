@@ -8,6 +8,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('authenication.urls')),
     path('api/vendors/', include('vendors.urls')),
+    path('api/core/', include('core.urls')),
 ]
 
 # Serve media files during development
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Pay for URL resolution, serializer fields and DB connections before the first request
+if settings.WARMUP_ON_STARTUP:
+    from core.warmup import warmup
+    warmup()
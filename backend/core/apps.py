@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from .query_stats import install
+
+        if settings.QUERY_STATS_ENABLED:
+            connection_created.connect(install, dispatch_uid='core.query_stats')
@@ -0,0 +1,80 @@
+"""
+File based cache whose add() and incr() are atomic across the processes of one host.
+
+Django's FileBasedCache implements add() as has_key() + set() and incr() as
+get() + set(), so two workers can both win an add() or lose an increment. Rate
+limit counters and idempotency locks depend on exactly those two operations,
+so here they run under an exclusive lock on one of LOCK_SHARDS lock files in
+the cache directory. Every worker on the host sees the same counters; a
+deployment spanning several hosts still needs Redis or Memcached.
+"""
+import hashlib
+import os
+import pickle
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_SHARDS = 64
+
+
+def _lock(f):
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_EX)
+    else:
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(f):
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class LockedFileBasedCache(FileBasedCache):
+    @contextmanager
+    def _locked(self, key, version):
+        key = self.make_and_validate_key(key, version=version)
+        shard = int(hashlib.md5(key.encode()).hexdigest(), 16) % LOCK_SHARDS
+        # Lock files live in a subdirectory, out of reach of the cache's cull and clear
+        lock_dir = os.path.join(self._dir, 'locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f'{shard}.lock'), 'a+b') as f:
+            f.seek(0)
+            _lock(f)
+            try:
+                yield
+            finally:
+                _unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked(key, version):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # decr() goes through incr() as well. Unlike BaseCache.incr() this keeps the key's
+        # expiry instead of resetting it to the default timeout, so window counters and
+        # lockouts live exactly as long as they were added for.
+        with self._locked(key, version):
+            try:
+                with open(self._key_to_file(key, version), 'rb') as f:
+                    expiry = pickle.load(f)
+                    if expiry is not None and expiry < time.time():
+                        raise FileNotFoundError
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except (FileNotFoundError, EOFError):
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            self.set(key, value, None if expiry is None else expiry - time.time(), version)
+            return value
@@ -0,0 +1,112 @@
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _request_scope(request):
+    """Keys are only unique per caller, so namespace them by user or client IP"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u{user.pk}'
+    return f'ip{BaseThrottle().get_ident(request)}'
+
+
+def _fingerprint(request):
+    """Hash of the request payload, used to detect a key reused for a different request"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        items = []
+        for field, values in sorted(data.lists()):
+            for value in values:
+                if isinstance(value, UploadedFile):
+                    value = ['file', value.name, value.size]
+                items.append([field, value])
+        payload = json.dumps(items, default=str)
+    else:
+        payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method}:{request.path}:{payload}'.encode()).hexdigest()
+
+
+def _replay(entry, fingerprint):
+    if entry['fingerprint'] != fingerprint:
+        return Response({
+            'error': 'Idempotency-Key was already used for a different request'
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(entry['data'], status=entry['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_func):
+    """
+    Replay the stored response for requests that repeat an Idempotency-Key header.
+
+    Apply below @api_view so the view receives a DRF request. Requests without the
+    header are passed through untouched. Concurrent duplicates wait on a cache lock
+    and then replay the first response instead of repeating the work.
+
+    Not for views whose response carries a credential, such as a token: the stored
+    copy would be replayed for IDEMPOTENCY_TTL, even after that token is revoked.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_func(request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        cache = caches[settings.IDEMPOTENCY_CACHE]
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        cache_key = f'idem:{_request_scope(request)}:{request.path}:{digest}'
+        lock_key = f'{cache_key}:lock'
+        fingerprint = _fingerprint(request)
+
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return _replay(entry, fingerprint)
+
+        # Serialize concurrent duplicates: only the lock holder runs the view
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_TIMEOUT
+        while not cache.add(lock_key, True, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                return Response({
+                    'error': 'A request with this Idempotency-Key is still being processed'
+                }, status=status.HTTP_409_CONFLICT)
+            time.sleep(LOCK_POLL_INTERVAL)
+
+        try:
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return _replay(entry, fingerprint)
+
+            response = view_func(request, *args, **kwargs)
+
+            # Server errors are not stored so the client can retry them
+            if response.status_code < 500:
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, settings.IDEMPOTENCY_TTL)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
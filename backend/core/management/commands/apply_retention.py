@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.retention import get_policies, report, run_policy
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete stale rows according to RETENTION_POLICIES, resuming interrupted runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', dest='policies',
+                            help='Only run this policy (repeatable); default is all, in settings order')
+        parser.add_argument('--batch-size', type=int, default=settings.RETENTION_BATCH_SIZE)
+        parser.add_argument('--duty-cycle', type=float, default=settings.RETENTION_DUTY_CYCLE,
+                            help='Fraction of wall time spent running batches, the rest is sleep')
+        parser.add_argument('--restart', action='store_true', help='Ignore unfinished checkpoints and start over')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not 0 < options['duty_cycle'] <= 1:
+            raise CommandError('--duty-cycle must be in (0, 1]')
+        try:
+            policies = get_policies(options['policies'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            for policy in policies:
+                result = report(policy)
+                resume = f", resuming after #{result['resuming_after']}" if result['resuming_after'] is not None else ''
+                self.stdout.write(
+                    f"{result['policy']}: {result['rows']} {result['model']} rows older than "
+                    f"{result['cutoff']:%Y-%m-%d %H:%M} would be moved (oldest {result['oldest'] or '-'}{resume})"
+                )
+            return
+
+        def progress(policy, checkpoint, moved):
+            self.stdout.write(f'{policy.name}: moved {moved} rows, {checkpoint.processed} so far, up to #{checkpoint.last_pk}')
+
+        for policy in policies:
+            checkpoint = run_policy(
+                policy, options['batch_size'], options['duty_cycle'], restart=options['restart'], progress=progress
+            )
+            self.stdout.write(self.style.SUCCESS(f'{policy.name}: {checkpoint.processed} rows archived'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import collapsed, load_aggregate, profiled_routes
+
+
+class Command(BaseCommand):
+    help = 'List sampled routes, or write the aggregated collapsed stacks of one route'
+
+    def add_arguments(self, parser):
+        parser.add_argument('route', nargs='?', help='URL name of the route, as listed without arguments')
+        parser.add_argument('--hours', type=int, default=1, help='How many recent hourly aggregates to merge')
+        parser.add_argument('--output', help='Write the collapsed stacks to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if not options['route']:
+            for route in profiled_routes():
+                requests, stacks = load_aggregate(route, options['hours'])
+                if requests:
+                    self.stdout.write(f'{requests:8} requests {sum(stacks.values()):9} samples  {route}')
+            return
+
+        requests, stacks = load_aggregate(options['route'], options['hours'])
+        output = collapsed(stacks, options['route'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(f'{requests} requests, {sum(stacks.values())} samples written to {options["output"]}')
+        else:
+            self.stdout.write(output, ending='')
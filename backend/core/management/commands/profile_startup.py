@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.startup_profile import PHASE_MARKER
+
+
+def parse_importtime(stderr):
+    """Split `-X importtime` output by phase; returns {phase: [(module, self_us, cumulative_us)]}"""
+    phases = defaultdict(list)
+    phase = 'interpreter'
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            phase = line[len(PHASE_MARKER):].strip()
+            continue
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # header line
+        phases[phase].append((module.strip(), int(self_us), int(cumulative_us)))
+    return phases
+
+
+class Command(BaseCommand):
+    help = 'Report worker cold start cost: import time per module and first request time per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warmup', action='store_true',
+                            help='Run core.warmup before the first requests, to compare against a cold worker')
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        command = [sys.executable, '-X', 'importtime', '-m', 'core.startup_profile']
+        if options['warmup']:
+            command.append('--warmup')
+        process = subprocess.run(command, cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True)
+        if process.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{process.stderr[-2000:]}')
+
+        result = json.loads(process.stdout)
+        phases = parse_importtime(process.stderr)
+        top = options['top']
+
+        boot_imports = phases['interpreter'] + phases['boot']
+        self.stdout.write(
+            f"Boot: {result['boot'] * 1000:.1f} ms, "
+            f"{len(boot_imports)} modules imported in {sum(m[1] for m in boot_imports) / 1000:.1f} ms"
+        )
+
+        by_package = defaultdict(int)
+        for module, self_us, _ in boot_imports:
+            by_package[module.split('.')[0]] += self_us
+        self.stdout.write('\nSlowest packages to import:')
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {package}')
+
+        self.stdout.write('\nSlowest modules to import (self time):')
+        for module, self_us, _ in sorted(boot_imports, key=lambda m: -m[1])[:top]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {module}')
+
+        if options['warmup']:
+            steps = ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in result['warmup_steps'].items())
+            self.stdout.write(f"\nWarmup: {result['warmup'] * 1000:.1f} ms ({steps})")
+
+        self.stdout.write('\nFirst request per view (lazy imports are attributed to the first request):')
+        self.stdout.write(f"  {'first ms':>9} {'second ms':>10} {'imports ms':>11}  status  view")
+        for view in sorted(result['views'], key=lambda v: -v['first']):
+            lazy_imports = phases[f"view {view['name']}"]
+            self.stdout.write(
+                f"  {view['first'] * 1000:9.1f} {view['second'] * 1000:10.1f} "
+                f"{sum(m[1] for m in lazy_imports) / 1000:11.1f}  {view['status']:>6}  {view['method']} {view['name']}"
+            )
+
+        total_first = sum(view['first'] for view in result['views'])
+        total_second = sum(view['second'] for view in result['views'])
+        self.stdout.write(self.style.SUCCESS(
+            f'\nFirst requests took {total_first * 1000:.1f} ms in total, warm requests {total_second * 1000:.1f} ms'
+        ))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import TOKEN_HEADER, create_token
+
+
+class Command(BaseCommand):
+    help = 'Mint a signed token that makes the request profiler capture a request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Staff user the token is issued for')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options['username'], is_staff=True).first()
+        if user is None:
+            raise CommandError(f"No staff user named '{options['username']}'")
+
+        token = create_token(user.username)
+        self.stdout.write(token)
+        self.stderr.write(
+            f'Valid for {settings.PROFILER_TOKEN_MAX_AGE // 60} minutes. Send it as the {TOKEN_HEADER} header '
+            f'(or the _profile query parameter); the X-Profile-Id response header names the files '
+            f'written to {settings.PROFILER_OUTPUT_DIR}.'
+        )
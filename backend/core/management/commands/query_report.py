@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from core.models import QueryFingerprint, QueryPlan
+
+ORDERINGS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'count': '-count',
+    'slow': '-slow_count',
+}
+
+
+class Command(BaseCommand):
+    help = 'List the most expensive SQL fingerprints per route, with their captured EXPLAIN plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Only include processes active in the last N hours')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--route', help='Only include this URL name')
+        parser.add_argument('--order', choices=sorted(ORDERINGS), default='total')
+
+    def handle(self, *args, **options):
+        fingerprints = QueryFingerprint.objects.filter(
+            updated_at__gte=timezone.now() - timezone.timedelta(hours=options['hours'])
+        )
+        if options['route']:
+            fingerprints = fingerprints.filter(route=options['route'])
+
+        offenders = list(
+            fingerprints.values('route', 'digest', 'sql')
+            .annotate(count=Sum('count'), total_ms=Sum('total_ms'), max_ms=Max('max_ms'), slow_count=Sum('slow_count'))
+            .order_by(ORDERINGS[options['order']])[:options['top']]
+        )
+        plans = dict(
+            QueryPlan.objects.filter(digest__in={row['digest'] for row in offenders}).values_list('digest', 'plan')
+        )
+
+        if not offenders:
+            self.stdout.write('No query stats recorded in this period')
+            return
+
+        for rank, row in enumerate(offenders, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{rank} {row['route']}: total {row['total_ms']:.1f} ms, {row['count']} calls, "
+                f"avg {row['total_ms'] / row['count']:.2f} ms, max {row['max_ms']:.1f} ms, {row['slow_count']} slow"
+            ))
+            self.stdout.write(f"    {row['sql']}")
+            plan = plans.get(row['digest'])
+            if plan:
+                self.stdout.write('    plan:')
+                for line in plan.splitlines():
+                    self.stdout.write(f'      {line}')
+            self.stdout.write('')
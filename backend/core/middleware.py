@@ -0,0 +1,164 @@
+"""
+Adaptive concurrency limiting and load shedding.
+
+Every request is mapped to a route class (auth, status, default, bulk) by its
+URL name. Each class has its own in-flight limit which is tuned from observed
+latency with a gradient rule: while latency stays close to the class's long
+term average the limit grows, when it rises the limit shrinks. On top of that
+all classes share CONCURRENCY_MAX_IN_FLIGHT, and a class may only admit a
+request while the total in flight is below its share of it, so bulk traffic
+is shed first and auth/status reads keep the last slots.
+
+Requests over the limit are rejected right away with 503 and Retry-After
+instead of queueing until the worker or database times out. Limits are per
+process; size CONCURRENCY_MAX_IN_FLIGHT so that workers x limit stays inside
+the database connection budget.
+"""
+import math
+import random
+import threading
+import time
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+
+DEFAULT_CLASS = 'default'
+
+
+class AdaptiveLimit:
+    """In-flight limit for one route class, adjusted once per window of samples"""
+
+    def __init__(self, initial_limit, min_limit, max_limit, share):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.share = share
+        self.in_flight = 0
+        self.long_latency = None
+        self._window_total = 0.0
+        self._window_count = 0
+        self._window_max_in_flight = 0
+
+    def has_capacity(self):
+        return self.in_flight < int(self.limit)
+
+    def start(self):
+        self.in_flight += 1
+        self._window_max_in_flight = max(self._window_max_in_flight, self.in_flight)
+
+    def finish(self, latency):
+        """Add a latency sample; recompute the limit when the window is full"""
+        self.in_flight -= 1
+        self._window_total += latency
+        self._window_count += 1
+        if self._window_count < settings.CONCURRENCY_WINDOW_SAMPLES:
+            return
+
+        short_latency = max(self._window_total / self._window_count, 1e-6)
+        # Only grow while the limit is actually in use, an idle class must not inflate it
+        app_limited = self._window_max_in_flight < self.limit / 2
+        self._window_total = 0.0
+        self._window_count = 0
+        self._window_max_in_flight = self.in_flight
+
+        if self.long_latency is None:
+            self.long_latency = short_latency
+            return
+        if self.long_latency / short_latency > 2:
+            # Latency recovered well below the baseline; let the baseline follow it down quickly
+            self.long_latency = short_latency
+        else:
+            self.long_latency += (short_latency - self.long_latency) * settings.CONCURRENCY_BASELINE_SMOOTHING
+
+        gradient = max(0.5, min(1.0, settings.CONCURRENCY_LATENCY_TOLERANCE * self.long_latency / short_latency))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        if app_limited and new_limit > self.limit:
+            return
+        self.limit += (new_limit - self.limit) * settings.CONCURRENCY_LIMIT_SMOOTHING
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_in_flight, classes):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.classes = {
+            name: AdaptiveLimit(
+                config['initial_limit'], config['min_limit'], config['max_limit'], config['share']
+            )
+            for name, config in classes.items()
+        }
+        self._lock = threading.Lock()
+
+    def acquire(self, route_class):
+        """Reserve a slot; returns False when the request should be shed"""
+        limit = self.classes[route_class]
+        with self._lock:
+            if not limit.has_capacity() or self.in_flight >= self.max_in_flight * limit.share:
+                return False
+            limit.start()
+            self.in_flight += 1
+            return True
+
+    def release(self, route_class, latency):
+        limit = self.classes[route_class]
+        with self._lock:
+            self.in_flight -= 1
+            limit.finish(latency)
+
+
+@lru_cache(maxsize=2048)
+def route_class_for(path):
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return DEFAULT_CLASS
+    routes = settings.CONCURRENCY_ROUTE_CLASSES
+    return routes.get(match.view_name) or routes.get(match.namespace) or DEFAULT_CLASS
+
+
+def overloaded_response():
+    retry_after = settings.CONCURRENCY_RETRY_AFTER_SECONDS
+    response = JsonResponse({'error': 'Server is busy, please retry shortly'}, status=503)
+    # Jitter so shed clients do not all come back in the same second
+    response['Retry-After'] = str(retry_after + random.randint(0, retry_after))
+    return response
+
+
+class ConcurrencyLimitMiddleware:
+    """Sheds requests over the adaptive per-route-class limit; works under WSGI and ASGI"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiter = ConcurrencyLimiter(settings.CONCURRENCY_MAX_IN_FLIGHT, settings.CONCURRENCY_CLASSES)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        route_class = route_class_for(request.path_info)
+        if not self.limiter.acquire(route_class):
+            return overloaded_response()
+        start = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            self.limiter.release(route_class, time.monotonic() - start)
+
+    async def __acall__(self, request):
+        route_class = route_class_for(request.path_info)
+        if not self.limiter.acquire(route_class):
+            return overloaded_response()
+        start = time.monotonic()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.limiter.release(route_class, time.monotonic() - start)
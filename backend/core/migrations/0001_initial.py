@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=40, unique=True)),
+                ('sql', models.TextField()),
+                ('plan', models.TextField()),
+                ('duration_ms', models.FloatField()),
+                ('captured_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QueryFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process', models.CharField(max_length=100)),
+                ('route', models.CharField(max_length=200)),
+                ('digest', models.CharField(max_length=40)),
+                ('sql', models.TextField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('slow_count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('process', 'route', 'digest'), name='query_fingerprint_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class QueryFingerprint(models.Model):
+    """
+    Per-process running totals for one normalized SQL statement on one route (see core.query_stats).
+
+    Each worker process upserts its own cumulative row, so totals are summed across processes.
+    """
+    process = models.CharField(max_length=100)
+    route = models.CharField(max_length=200)
+    digest = models.CharField(max_length=40)
+    sql = models.TextField()
+    count = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    slow_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['process', 'route', 'digest'], name='query_fingerprint_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.route}: {self.sql[:80]}"
+
+class QueryPlan(models.Model):
+    """Latest EXPLAIN output captured for a slow statement fingerprint"""
+    digest = models.CharField(max_length=40, unique=True)
+    sql = models.TextField()
+    plan = models.TextField()
+    duration_ms = models.FloatField()
+    captured_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.sql[:80]
+
+class ArchivedRecord(models.Model):
+    """Row moved out of its hot table by a retention policy (see core.retention)"""
+    policy = models.CharField(max_length=100)
+    model = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_pk'], name='archived_record_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_pk}"
+
+class RetentionCheckpoint(models.Model):
+    """Progress of a retention policy run, so an interrupted run resumes after last_pk"""
+    policy = models.CharField(max_length=100, unique=True)
+    cutoff = models.DateTimeField()
+    last_pk = models.BigIntegerField(default=0)
+    processed = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.policy} after #{self.last_pk}"
@@ -0,0 +1,150 @@
+"""
+Two-tier cache for model rows.
+
+Tier one is a bounded in-process LRU. Tier two is a shared Django cache
+backend (OBJECT_CACHE), so a row loaded by one worker is reused by the others.
+Every cached object has a version token in the shared tier, and values are
+stored under their version. invalidate() replaces the token with a fresh random
+one after commit and drops the local copy. Other workers serve their local copy
+for at most OBJECT_CACHE_LOCAL_TTL seconds, then re-read the version and refetch
+if it changed. That TTL is the bound on stale reads across workers.
+
+Tokens are random rather than counters, so replacing one is a plain set (no
+atomic incr needed), and a version key that was culled or expired is replaced
+by a new token too. A value stored under an old token is never read again.
+
+Rows are cached as tuples and turned into a fresh model instance on every
+get, so callers can never mutate a shared copy.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_MISSING = object()
+_registry = {}
+
+
+class TwoTierCache:
+    """Local LRU with TTL in front of the shared cache; loader(key) fills misses"""
+
+    def __init__(self, namespace, loader):
+        self.namespace = namespace
+        self.loader = loader
+        self._local = OrderedDict()  # key -> (expires_at, version, value)
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(
+            ['local_hits', 'shared_hits', 'revalidations', 'misses', 'evictions', 'invalidations'], 0
+        )
+        _registry[namespace] = self
+
+    def _shared(self):
+        return caches[settings.OBJECT_CACHE]
+
+    def _version_key(self, key):
+        return f'obj:{self.namespace}:{key}:version'
+
+    def _value_key(self, key, version):
+        return f'obj:{self.namespace}:{key}:v{version}'
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _store_local(self, key, version, value):
+        with self._lock:
+            self._local[key] = (time.monotonic() + settings.OBJECT_CACHE_LOCAL_TTL, version, value)
+            self._local.move_to_end(key)
+            while len(self._local) > settings.OBJECT_CACHE_LOCAL_MAX_ENTRIES:
+                self._local.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._local.move_to_end(key)
+                self.stats['local_hits'] += 1
+                return entry[2]
+
+        shared = self._shared()
+        version = self._current_version(shared, key)
+        if entry is not None and version == entry[1]:
+            # Expired locally but still current, one round trip renews it
+            self._store_local(key, version, entry[2])
+            self._count('revalidations')
+            return entry[2]
+
+        value = shared.get(self._value_key(key, version), _MISSING)
+        if value is _MISSING:
+            self._count('misses')
+            # The version was read before loading, so a concurrent invalidation can only orphan this value
+            value = self.loader(key)
+            shared.set(self._value_key(key, version), value, settings.OBJECT_CACHE_SHARED_TTL)
+        else:
+            self._count('shared_hits')
+        self._store_local(key, version, value)
+        return value
+
+    def _current_version(self, shared, key):
+        version_key = self._version_key(key)
+        version = shared.get(version_key)
+        if version is None:
+            # Never set, or culled: start a new token so nothing stored under an older one is served
+            version = uuid.uuid4().hex
+            if not shared.add(version_key, version, None):
+                version = shared.get(version_key) or version
+        return version
+
+    def _bump(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+            self.stats['invalidations'] += 1
+        self._shared().set(self._version_key(key), uuid.uuid4().hex, None)
+
+    def invalidate(self, key):
+        """Bump the key's version once the current transaction commits"""
+        transaction.on_commit(lambda: self._bump(key))
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def local_size(self):
+        with self._lock:
+            return len(self._local)
+
+
+class ModelCache(TwoTierCache):
+    """
+    Caches rows of one model by a unique field; get_instance() returns a fresh instance or None.
+
+    Fields in `exclude` are not cached and load from the database on access.
+    """
+
+    def __init__(self, model, field='pk', exclude=()):
+        self.model = model
+        self.field = field
+        self.attnames = [f.attname for f in model._meta.concrete_fields if f.name not in exclude]
+        super().__init__(f'{model._meta.label_lower}:{field}', self._load)
+
+    def _load(self, key):
+        return self.model._base_manager.filter(**{self.field: key}).values_list(*self.attnames).first()
+
+    def get_instance(self, key):
+        row = self.get(key)
+        if row is None:
+            return None
+        return self.model.from_db(DEFAULT_DB_ALIAS, self.attnames, row)
+
+
+def cache_stats():
+    """Counters and local size of every two-tier cache in this process"""
+    return {
+        namespace: {**cache.stats, 'local_entries': cache.local_size()}
+        for namespace, cache in _registry.items()
+    }
@@ -0,0 +1,226 @@
+"""
+Sampling request profiler.
+
+A request is profiled when it carries a staff profile token (minted with
+`manage.py profile_token`) in the X-Profile-Token header or the _profile query
+parameter, or when it is picked at random with probability PROFILER_SAMPLE_RATE.
+
+While the request runs, a background thread samples the Python stack of the
+request thread every PROFILER_INTERVAL_MS. Token requests store a collapsed-stack
+file (input for flamegraph.pl / speedscope) and a SQL timeline in
+PROFILER_OUTPUT_DIR and return the profile id in the X-Profile-Id header.
+Randomly sampled requests are merged into an hourly per-route aggregate in
+PROFILER_CACHE, read back with `manage.py profile_report`.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.db import connections
+
+TOKEN_HEADER = 'X-Profile-Token'
+TOKEN_PARAM = '_profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+TOKEN_SALT = 'core.profiling'
+ROUTES_KEY = 'profiler:routes'
+
+
+def create_token(username):
+    return signing.dumps({'by': username}, salt=TOKEN_SALT)
+
+
+def read_token(token):
+    """Return the staff username a valid, unexpired token was issued for, else None"""
+    try:
+        username = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE)['by']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+    # The token outlives a staff flag revoked after it was minted
+    if not get_user_model().objects.filter(username=username, is_staff=True, is_active=True).exists():
+        return None
+    return username
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Samples one thread's stack, below a root frame, from a background thread"""
+
+    def __init__(self, thread_id, root_frame, interval):
+        self.thread_id = thread_id
+        self.root_frame = root_frame
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame is not self.root_frame:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class SQLTimeline:
+    """execute_wrapper recording start offset and duration of every query"""
+
+    def __init__(self, started, alias):
+        self.started = started
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                'alias': self.alias,
+                'start_ms': round((start - self.started) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3),
+                'sql': sql,
+                'many': many,
+            })
+
+
+def collapsed(stacks, root):
+    return ''.join(f'{root};{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+def profile_request(get_response, request, keep_sql):
+    """Run get_response under the sampler; returns (response, stack counter, SQL timeline, seconds)"""
+    started = time.perf_counter()
+    timelines = []
+    sampler = StackSampler(threading.get_ident(), sys._getframe(), settings.PROFILER_INTERVAL_MS / 1000)
+    with ExitStack() as stack:
+        if keep_sql:
+            for connection in connections.all():
+                timeline = SQLTimeline(started, connection.alias)
+                stack.enter_context(connection.execute_wrapper(timeline))
+                timelines.append(timeline)
+        stack.enter_context(sampler)
+        response = get_response(request)
+    queries = sorted((query for timeline in timelines for query in timeline.queries), key=lambda q: q['start_ms'])
+    return response, sampler.stacks, queries, time.perf_counter() - started
+
+
+def store_profile(request, stacks, queries, elapsed, issued_by):
+    """Write <id>.collapsed and <id>.sql.json to PROFILER_OUTPUT_DIR; returns the id"""
+    route = route_name(request)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_]+', '_', route)}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(settings.PROFILER_OUTPUT_DIR, exist_ok=True)
+    base = os.path.join(settings.PROFILER_OUTPUT_DIR, profile_id)
+    with open(f'{base}.collapsed', 'w') as f:
+        f.write(collapsed(stacks, f'{request.method} {route}'))
+    with open(f'{base}.sql.json', 'w') as f:
+        json.dump({
+            'route': route,
+            'method': request.method,
+            'path': request.path,
+            'issued_by': issued_by,
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'sql_ms': round(sum(query['duration_ms'] for query in queries), 3),
+            'queries': queries,
+        }, f, indent=2)
+    return profile_id
+
+
+def aggregate_key(route, hour):
+    return f'profiler:{route}:{hour}'
+
+
+def record_sample(request, stacks):
+    """Merge a randomly sampled request into the route's aggregate for the current hour"""
+    if not stacks:
+        return
+    cache = caches[settings.PROFILER_CACHE]
+    route = route_name(request)
+    hour = int(time.time() // 3600)
+    timeout = settings.PROFILER_AGGREGATE_HOURS * 3600
+    key = aggregate_key(route, hour)
+
+    # Read-modify-write without a lock: concurrent workers may drop a sample, which is fine for a sampling profiler
+    aggregate = cache.get(key) or {'requests': 0, 'stacks': {}}
+    merged = Counter(aggregate['stacks'])
+    merged.update(stacks)
+    aggregate['requests'] += 1
+    aggregate['stacks'] = dict(merged.most_common(settings.PROFILER_MAX_STACKS))
+    cache.set(key, aggregate, timeout)
+
+    routes = cache.get(ROUTES_KEY) or set()
+    if route not in routes:
+        routes.add(route)
+        cache.set(ROUTES_KEY, routes, timeout)
+
+
+def load_aggregate(route, hours):
+    """Merge the last `hours` hourly aggregates of a route; returns (requests, stack counter)"""
+    cache = caches[settings.PROFILER_CACHE]
+    current = int(time.time() // 3600)
+    buckets = cache.get_many([aggregate_key(route, hour) for hour in range(current - hours + 1, current + 1)])
+    stacks = Counter()
+    requests = 0
+    for aggregate in buckets.values():
+        requests += aggregate['requests']
+        stacks.update(aggregate['stacks'])
+    return requests, stacks
+
+
+def profiled_routes():
+    return sorted(caches[settings.PROFILER_CACHE].get(ROUTES_KEY) or ())
+
+
+class RequestProfilerMiddleware:
+    """
+    Profiles requests carrying a staff profile token, plus a random PROFILER_SAMPLE_RATE
+    of all requests. Sync only, and last in MIDDLEWARE, so that under ASGI the view runs
+    in the thread that is being sampled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.headers.get(TOKEN_HEADER) or request.GET.get(TOKEN_PARAM)
+        issued_by = read_token(token) if token else None
+        if issued_by is None and random.random() >= settings.PROFILER_SAMPLE_RATE:
+            return self.get_response(request)
+
+        response, stacks, queries, elapsed = profile_request(self.get_response, request, keep_sql=issued_by is not None)
+        if issued_by is not None:
+            response[PROFILE_ID_HEADER] = store_profile(request, stacks, queries, elapsed, issued_by)
+        else:
+            record_sample(request, stacks)
+        return response
@@ -0,0 +1,209 @@
+"""
+Query fingerprinting and slow-query capture.
+
+Every statement run while a request is handled is normalized into a
+fingerprint (literals and placeholders replaced, IN lists and multi-row
+VALUES collapsed) and counted per route. Statements slower than
+QUERY_STATS_SLOW_MS are explained once per process on a background thread,
+with EXPLAIN on PostgreSQL and EXPLAIN QUERY PLAN on SQLite. The same thread
+upserts each process's cumulative totals into QueryFingerprint every
+QUERY_STATS_FLUSH_SECONDS, so requests never wait on either.
+`manage.py query_report` lists the top offenders with their plans.
+"""
+import contextvars
+import hashlib
+import logging
+import os
+import queue
+import re
+import socket
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from .models import QueryFingerprint, QueryPlan
+
+logger = logging.getLogger(__name__)
+
+# Set by QueryStatsMiddleware for the duration of a view; statements outside a request are not counted
+current_route = contextvars.ContextVar('query_stats_route', default=None)
+
+EXPLAINABLE = {'SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'}
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\((?:\s*\?\s*,)*\s*\?\s*\)')
+_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Return (digest, normalized sql) for a statement"""
+    normalized = _STRING.sub('?', sql)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _LIST.sub('(...)', normalized)
+    normalized = _ROWS.sub('(...)', normalized)
+    normalized = _SPACE.sub(' ', normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest(), normalized
+
+
+class QueryStats:
+    """Per-process totals plus the background thread that flushes them and runs EXPLAIN"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.process = f'{socket.gethostname()}:{self.pid}:{int(time.time())}'
+        self.totals = {}  # (route, digest) -> [sql, count, total_ms, max_ms, slow_count]
+        self.dirty = set()
+        self.explained = set()
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.tasks = queue.Queue(maxsize=settings.QUERY_STATS_QUEUE_SIZE)
+        self.worker = threading.Thread(target=self._run, name='query-stats', daemon=True)
+        self.worker.start()
+
+    def __call__(self, execute, sql, params, many, context):
+        route = current_route.get()
+        if route is None:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(route, context['connection'].alias, sql, params, many, (time.perf_counter() - start) * 1000)
+
+    def record(self, route, alias, sql, params, many, elapsed_ms):
+        digest, normalized = fingerprint(sql)
+        slow = elapsed_ms >= settings.QUERY_STATS_SLOW_MS
+        with self.lock:
+            entry = self.totals.get((route, digest))
+            if entry is None:
+                entry = self.totals[(route, digest)] = [normalized, 0, 0.0, 0.0, 0]
+            entry[1] += 1
+            entry[2] += elapsed_ms
+            entry[3] = max(entry[3], elapsed_ms)
+            entry[4] += slow
+            self.dirty.add((route, digest))
+            explain = (
+                slow and not many and digest not in self.explained
+                and normalized.split(' ', 1)[0].upper() in EXPLAINABLE
+            )
+            if explain:
+                self.explained.add(digest)
+        if explain and not self._submit(('explain', alias, digest, normalized, sql, params, elapsed_ms)):
+            with self.lock:
+                self.explained.discard(digest)
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush < settings.QUERY_STATS_FLUSH_SECONDS:
+            return
+        with self.lock:
+            self.last_flush = time.monotonic()
+            rows = {key: list(self.totals[key]) for key in self.dirty}
+            self.dirty.clear()
+        if rows and not self._submit(('flush', rows)):
+            with self.lock:
+                self.dirty.update(rows)
+
+    def _submit(self, task):
+        try:
+            self.tasks.put_nowait(task)
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task[0] == 'flush':
+                    self._flush(task[1])
+                else:
+                    self._explain(*task[1:])
+            except Exception:
+                logger.exception(f'Query stats {task[0]} failed')
+            finally:
+                for connection in connections.all(initialized_only=True):
+                    connection.close_if_unusable_or_obsolete()
+
+    def _flush(self, rows):
+        now = timezone.now()
+        QueryFingerprint.objects.bulk_create(
+            [
+                QueryFingerprint(
+                    process=self.process, route=route, digest=digest, sql=sql, count=count,
+                    total_ms=total_ms, max_ms=max_ms, slow_count=slow_count, updated_at=now,
+                )
+                for (route, digest), (sql, count, total_ms, max_ms, slow_count) in rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['process', 'route', 'digest'],
+            update_fields=['count', 'total_ms', 'max_ms', 'slow_count', 'updated_at'],
+            batch_size=500,
+        )
+
+    def _explain(self, alias, digest, normalized, sql, params, elapsed_ms):
+        connection = connections[alias]
+        prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+        if prefix is None:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        QueryPlan.objects.update_or_create(
+            digest=digest, defaults={'sql': normalized, 'plan': plan, 'duration_ms': elapsed_ms}
+        )
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats():
+    """The process's collector; recreated after a fork so each worker has its own thread and totals"""
+    global _stats
+    if _stats is None or _stats.pid != os.getpid():
+        with _stats_lock:
+            if _stats is None or _stats.pid != os.getpid():
+                _stats = QueryStats()
+    return _stats
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver: keep the collector installed on every new connection"""
+    stats = get_stats()
+    if stats not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, stats)
+
+
+class QueryStatsMiddleware:
+    """Tags the queries a view runs with its route for core.query_stats; sync only, next to the profiler"""
+
+    def __init__(self, get_response):
+        if not settings.QUERY_STATS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            token = getattr(request, '_query_stats_token', None)
+            if token is not None:
+                current_route.reset(token)
+            get_stats().maybe_flush()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_stats_token = current_route.set(request.resolver_match.view_name)
@@ -0,0 +1,203 @@
+"""
+Retention and archival of stale rows.
+
+Each entry of RETENTION_POLICIES selects the rows of one model that match its
+`filter` and are older than `older_than_days` on `age_field`, and moves them
+out of the hot table in keyset batches ordered by primary key:
+
+    archive 'table'   rows are serialized into ArchivedRecord in the delete's transaction
+    archive 'ndjson'  rows are appended to a gzip NDJSON file under RETENTION_ARCHIVE_DIR
+    archive None      rows are only deleted
+
+Every batch is one short transaction. It re-checks the policy on the selected
+rows, archives them together with the `children` rows that reference them,
+deletes them with the usual cascades and signals, and advances the policy's
+RetentionCheckpoint. An interrupted run resumes after the checkpoint with the
+same cutoff. Fields listed in `exclude_fields`, such as credentials, are never
+copied into an archive.
+
+Between batches the runner sleeps so it is busy at most RETENTION_DUTY_CYCLE
+of the time. The NDJSON archive is at-least-once: a batch interrupted between
+the file write and the commit is written again on resume.
+"""
+import gzip
+import json
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from .models import ArchivedRecord, RetentionCheckpoint
+
+ARCHIVE_MODES = {'table', 'ndjson', None}
+
+
+class ArchiveSpec:
+    """How rows are archived: the archive mode, file fields to delete after commit, fields never to copy"""
+
+    def __init__(self, name, config):
+        if config.get('archive') not in ARCHIVE_MODES:
+            raise ValueError(f"Retention policy '{name}' has unknown archive mode {config['archive']!r}")
+        self.archive = config.get('archive')
+        self.file_fields = config.get('file_fields', [])
+        self.exclude_fields = set(config.get('exclude_fields', ()))
+
+
+class Child(ArchiveSpec):
+    """Rows that reference a policy's rows and would otherwise vanish with them in the cascade"""
+
+    def __init__(self, name, model, config):
+        super().__init__(name, config)
+        relation = model._meta.get_field(config['relation'])
+        self.model = relation.related_model
+        self.lookup = f'{relation.field.name}__in'
+
+
+class Policy(ArchiveSpec):
+    def __init__(self, name, config):
+        super().__init__(name, config)
+        self.name = name
+        self.model = apps.get_model(config['model'])
+        self.filter = config.get('filter', {})
+        self.age_field = config['age_field']
+        self.older_than = timezone.timedelta(days=config['older_than_days'])
+        self.children = [Child(name, self.model, child) for child in config.get('children', [])]
+
+    def candidates(self, cutoff):
+        return self.model._base_manager.filter(**self.filter, **{f'{self.age_field}__lt': cutoff})
+
+
+def get_policies(names=None):
+    """Configured policies in RETENTION_POLICIES order, optionally limited to `names`"""
+    unknown = set(names or ()) - set(settings.RETENTION_POLICIES)
+    if unknown:
+        raise ValueError(f"Unknown retention policies: {', '.join(sorted(unknown))}")
+    return [
+        Policy(name, config)
+        for name, config in settings.RETENTION_POLICIES.items()
+        if not names or name in names
+    ]
+
+
+def _open_checkpoint(policy):
+    """Unfinished checkpoint of the policy, else None"""
+    return RetentionCheckpoint.objects.filter(policy=policy.name, finished_at__isnull=True).first()
+
+
+def report(policy):
+    """Dry run: what the next run would move, without writing anything"""
+    checkpoint = _open_checkpoint(policy)
+    cutoff = checkpoint.cutoff if checkpoint else timezone.now() - policy.older_than
+    pending = policy.candidates(cutoff).filter(pk__gt=checkpoint.last_pk if checkpoint else 0)
+    return {
+        'policy': policy.name,
+        'model': policy.model._meta.label,
+        'cutoff': cutoff,
+        'resuming_after': checkpoint.last_pk if checkpoint else None,
+        'rows': pending.count(),
+        'oldest': pending.aggregate(oldest=Min(policy.age_field))['oldest'],
+    }
+
+
+def _serialize(rows, exclude_fields):
+    records = json.loads(json.dumps(serializers.serialize('python', rows), cls=DjangoJSONEncoder))
+    for record in records:
+        for field in exclude_fields:
+            record['fields'].pop(field, None)
+    return records
+
+
+def _write_ndjson(policy, checkpoint, records):
+    directory = os.path.join(settings.RETENTION_ARCHIVE_DIR, policy.name)
+    os.makedirs(directory, exist_ok=True)
+    # One file per run; resumed batches append to it (gzip members concatenate)
+    path = os.path.join(directory, f'{checkpoint.started_at:%Y%m%d-%H%M%S}.ndjson.gz')
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+
+
+def _archive(policy, checkpoint, spec, rows):
+    """Archive rows as `spec` says; returns the (storage, name) of their files, to delete after commit"""
+    if rows and spec.archive:
+        records = _serialize(rows, spec.exclude_fields)
+        if spec.archive == 'table':
+            ArchivedRecord.objects.bulk_create([
+                ArchivedRecord(
+                    policy=policy.name, model=record['model'], object_pk=str(record['pk']), data=record['fields']
+                )
+                for record in records
+            ])
+        else:
+            _write_ndjson(policy, checkpoint, records)
+    return [
+        (getattr(row, field).storage, getattr(row, field).name)
+        for row in rows for field in spec.file_fields if getattr(row, field)
+    ]
+
+
+def _run_batch(policy, checkpoint, batch_size):
+    """Archive and delete the next batch; returns the number of rows moved, or None when done"""
+    pks = list(
+        policy.candidates(checkpoint.cutoff).filter(pk__gt=checkpoint.last_pk)
+        .order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not pks:
+        return None
+
+    with transaction.atomic():
+        # Re-check under lock, a row may have been verified or resubmitted since it was selected
+        rows = list(
+            policy.candidates(checkpoint.cutoff).filter(pk__in=pks)
+            .select_for_update(of=('self',)).order_by('pk')
+        )
+        if rows:
+            row_pks = [row.pk for row in rows]
+            # Children first, in the same transaction, so the cascade never removes anything unarchived
+            files = []
+            for child in policy.children:
+                child_rows = list(child.model._base_manager.filter(**{child.lookup: row_pks}).order_by('pk'))
+                files += _archive(policy, checkpoint, child, child_rows)
+            files += _archive(policy, checkpoint, policy, rows)
+
+            policy.model._base_manager.filter(pk__in=row_pks).delete()
+            if files:
+                transaction.on_commit(lambda: [storage.delete(name) for storage, name in files])
+
+        checkpoint.last_pk = pks[-1]
+        checkpoint.processed += len(rows)
+        checkpoint.save(update_fields=['last_pk', 'processed', 'updated_at'])
+    return len(rows)
+
+
+def run_policy(policy, batch_size, duty_cycle, restart=False, progress=None):
+    """Run a policy to completion, resuming its checkpoint unless `restart`; returns the checkpoint"""
+    checkpoint = None if restart else _open_checkpoint(policy)
+    if checkpoint is None:
+        now = timezone.now()
+        checkpoint, _ = RetentionCheckpoint.objects.update_or_create(policy=policy.name, defaults={
+            'cutoff': now - policy.older_than,
+            'last_pk': 0,
+            'processed': 0,
+            'started_at': now,
+            'finished_at': None,
+        })
+
+    while True:
+        started = time.monotonic()
+        moved = _run_batch(policy, checkpoint, batch_size)
+        if moved is None:
+            break
+        if progress:
+            progress(policy, checkpoint, moved)
+        # Stay idle long enough that batches take at most duty_cycle of the wall time
+        time.sleep((time.monotonic() - started) * (1 - duty_cycle) / duty_cycle)
+
+    checkpoint.finished_at = timezone.now()
+    checkpoint.save(update_fields=['finished_at', 'updated_at'])
+    return checkpoint
@@ -0,0 +1,100 @@
+"""
+Cold start probe, run in a fresh interpreter by `manage.py profile_startup` as
+
+    python -X importtime -m core.startup_profile [--warmup]
+
+It loads the WSGI application, optionally runs the warmup, then sends two
+requests to every named URL outside the admin and prints the timings as JSON
+on stdout. Phase markers are written to stderr between the steps so the
+parent can attribute the -X importtime lines to boot, warmup or a view.
+"""
+import argparse
+import io
+import json
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+PHASE_MARKER = '#startup-profile-phase'
+SKIPPED_NAMESPACES = {'admin'}
+
+
+def mark(phase):
+    sys.stderr.write(f'{PHASE_MARKER} {phase}\n')
+    sys.stderr.flush()
+
+
+def iter_routes(resolver, namespace=None):
+    from django.urls import URLResolver
+
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in SKIPPED_NAMESPACES:
+                continue
+            yield from iter_routes(pattern, pattern.namespace or namespace)
+        elif pattern.name:
+            name = f'{namespace}:{pattern.name}' if namespace else pattern.name
+            yield name, pattern
+
+
+def call(application, method, path):
+    """Send one request through the full WSGI stack; returns (status code, seconds)"""
+    body = b'{}' if method == 'POST' else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    start = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0]), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--warmup', action='store_true')
+    args = parser.parse_args()
+
+    result = {}
+    mark('boot')
+    start = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+    result['boot'] = time.perf_counter() - start
+
+    if args.warmup:
+        mark('warmup')
+        from core.warmup import warmup
+        start = time.perf_counter()
+        result['warmup_steps'] = warmup()
+        result['warmup'] = time.perf_counter() - start
+
+    from django.urls import get_resolver, reverse
+
+    result['views'] = []
+    for name, pattern in list(iter_routes(get_resolver())):
+        path = reverse(name, kwargs={key: 1 for key in pattern.pattern.converters})
+        view_class = getattr(pattern.callback, 'cls', None)
+        method = 'POST' if view_class is not None and not hasattr(view_class, 'get') else 'GET'
+        mark(f'view {name}')
+        status_code, first = call(application, method, path)
+        mark('between')
+        _, second = call(application, method, path)
+        result['views'].append({
+            'name': name, 'method': method, 'status': status_code, 'first': first, 'second': second,
+        })
+
+    mark('done')
+    json.dump(result, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.test import override_settings
+from . import object_cache
+
+
+def isolated_caches(test_class):
+    """
+    Class decorator: every cache alias becomes a private local memory cache, emptied
+    before each test together with the local tier of every two-tier object cache.
+    """
+    test_class = override_settings(CACHES={
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+        for alias in settings.CACHES
+    })(test_class)
+    set_up = test_class.setUp
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        for cache in object_cache._registry.values():
+            cache.clear_local()
+        set_up(self)
+
+    test_class.setUp = setUp
+    return test_class
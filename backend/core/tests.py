@@ -0,0 +1,407 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from vendors.models import BusinessDocument, BusinessProfile
+from .cache_backends import LockedFileBasedCache
+from .idempotency import REPLAYED_HEADER, idempotent
+from .middleware import AdaptiveLimit, ConcurrencyLimitMiddleware
+from .models import ArchivedRecord, RetentionCheckpoint
+from .profiling import PROFILE_ID_HEADER, TOKEN_PARAM, TOKEN_SALT, create_token, read_token
+from .query_stats import fingerprint
+from .retention import _run_batch, get_policies, report, run_policy
+from .testing import isolated_caches
+from .warmup import warmup
+
+
+class LockedFileBasedCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = LockedFileBasedCache(directory.name, {})
+
+    def test_concurrent_increments_are_not_lost(self):
+        self.cache.add('counter', 0, 60)
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: self.cache.incr('counter'), range(200)))
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_only_one_add_wins(self):
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda n: self.cache.add('lock', n, 60), range(50)))
+        self.assertEqual(results.count(True), 1)
+
+    def test_incr_keeps_expiry(self):
+        self.cache.add('window', 1, 1)
+        self.assertEqual(self.cache.incr('window', 2), 3)
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get('window'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('window')
+
+
+@isolated_caches
+class IdempotentTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+        @api_view(['POST'])
+        @authentication_classes([])
+        @permission_classes([AllowAny])
+        @idempotent
+        def create_order(request):
+            self.calls.append(request.data)
+            self.release.wait(5)
+            return Response({'order': len(self.calls)}, status=201)
+
+        self.view = create_order
+
+    def post(self, data, key='key-1'):
+        request = APIRequestFactory().post('/orders/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        return self.view(request)
+
+    def test_repeated_key_replays_the_response(self):
+        first = self.post({'item': 1})
+        second = self.post({'item': 1})
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual((second.status_code, second.data), (201, {'order': 1}))
+        self.assertNotIn(REPLAYED_HEADER, first)
+        self.assertEqual(second[REPLAYED_HEADER], 'true')
+        self.assertEqual(self.post({'item': 1}, key='key-2').data, {'order': 2})
+
+    def test_key_reused_for_another_payload_is_rejected(self):
+        self.post({'item': 1})
+        response = self.post({'item': 2})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_concurrent_duplicate_waits_and_replays(self):
+        self.release.clear()
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(self.post, {'item': 1})
+            while not self.calls:
+                time.sleep(0.01)
+            duplicate = pool.submit(self.post, {'item': 1})
+            time.sleep(0.2)
+            self.assertFalse(duplicate.done())
+            self.release.set()
+            responses = [first.result(), duplicate.result()]
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual([r.data for r in responses], [{'order': 1}, {'order': 1}])
+        self.assertEqual(responses[1][REPLAYED_HEADER], 'true')
+
+
+@override_settings(
+    CONCURRENCY_WINDOW_SAMPLES=16, CONCURRENCY_LATENCY_TOLERANCE=1.5,
+    CONCURRENCY_LIMIT_SMOOTHING=1.0, CONCURRENCY_BASELINE_SMOOTHING=0.0,
+)
+class AdaptiveLimitTests(SimpleTestCase):
+    def setUp(self):
+        self.limit = AdaptiveLimit(initial_limit=16, min_limit=8, max_limit=24, share=1.0)
+
+    def busy_window(self, latency):
+        for _ in range(16):
+            self.limit.start()
+        for _ in range(16):
+            self.limit.finish(latency)
+
+    def idle_window(self, latency):
+        for _ in range(16):
+            self.limit.start()
+            self.limit.finish(latency)
+
+    def test_first_window_only_sets_the_baseline(self):
+        self.busy_window(0.125)
+        self.assertEqual((self.limit.limit, self.limit.long_latency), (16, 0.125))
+
+    def test_steady_latency_grows_the_limit(self):
+        self.busy_window(0.125)
+        self.busy_window(0.125)
+        # gradient 1: limit + sqrt(limit)
+        self.assertEqual(self.limit.limit, 20)
+        self.busy_window(0.125)
+        self.assertEqual(self.limit.limit, 24)  # capped at max_limit
+
+    def test_rising_latency_shrinks_the_limit(self):
+        self.busy_window(0.125)
+        self.busy_window(0.5)
+        # gradient bottoms out at 0.5: limit / 2 + sqrt(limit)
+        self.assertEqual(self.limit.limit, 12)
+        self.busy_window(0.5)
+        self.busy_window(0.5)
+        self.assertEqual(self.limit.limit, 8)  # floored at min_limit
+
+    def test_idle_class_does_not_grow(self):
+        self.busy_window(0.125)
+        self.idle_window(0.125)
+        self.assertEqual(self.limit.limit, 16)
+
+
+@override_settings(
+    CONCURRENCY_MAX_IN_FLIGHT=4,
+    CONCURRENCY_CLASSES={
+        'auth': {'share': 1.0, 'initial_limit': 4, 'min_limit': 1, 'max_limit': 4},
+        'default': {'share': 1.0, 'initial_limit': 1, 'min_limit': 1, 'max_limit': 4},
+        'bulk': {'share': 0.5, 'initial_limit': 4, 'min_limit': 1, 'max_limit': 4},
+    },
+    CONCURRENCY_RETRY_AFTER_SECONDS=2,
+)
+class ConcurrencyLimitMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.nested = []
+        self.middleware = ConcurrencyLimitMiddleware(self.view)
+
+    def view(self, request):
+        if self.nested:
+            return self.middleware(self.nested.pop(0))
+        return HttpResponse('ok')
+
+    def call(self, *route_classes):
+        """Start a request of each class, each one arriving while the previous ones are in flight"""
+        requests = [RequestFactory().get('/') for _ in route_classes]
+        self.nested = requests[1:]
+        with mock.patch('core.middleware.route_class_for', side_effect=route_classes):
+            return self.middleware(requests[0])
+
+    def test_request_over_the_class_limit_is_shed(self):
+        response = self.call('default', 'default')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn(int(response['Retry-After']), (2, 3, 4))
+        # The slot is given back afterwards
+        self.assertEqual(self.call('default').status_code, 200)
+        self.assertEqual(self.middleware.limiter.in_flight, 0)
+
+    def test_lower_classes_are_shed_first(self):
+        self.assertEqual(self.call('auth', 'auth', 'bulk').status_code, 503)
+        self.assertEqual(self.call('auth', 'bulk', 'auth', 'auth').status_code, 200)
+
+
+@isolated_caches
+class WarmupTests(SimpleTestCase):
+    databases = '__all__'
+
+    def test_closes_what_it_opened(self):
+        # In a thread of its own, like a worker that has not served anything yet
+        result = {}
+
+        def run():
+            with mock.patch.object(type(connections['default']), 'close', autospec=True) as close, \
+                    mock.patch('core.warmup.close_caches') as close_caches_mock:
+                with self.assertNoLogs('core.warmup', 'ERROR'):
+                    result['timings'] = warmup()
+                result['opened'] = [connections[alias] for alias in connections]
+                result['closed'] = [call.args[0] for call in close.call_args_list]
+                result['caches_closed'] = close_caches_mock.called
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(set(result['timings']), {'urls', 'serializers', 'connections'})
+        self.assertEqual(result['closed'], result['opened'])
+        self.assertTrue(result['caches_closed'])
+
+
+@isolated_caches
+@override_settings(PROFILER_SAMPLE_RATE=0)
+class ProfilerTokenTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create(username='staff', phone='+251900000000', is_staff=True)
+        output = tempfile.TemporaryDirectory()
+        self.addCleanup(output.cleanup)
+        self.output = output.name
+        self.enterContext(override_settings(PROFILER_OUTPUT_DIR=self.output))
+
+    def test_valid_token(self):
+        self.assertEqual(read_token(create_token('staff')), 'staff')
+
+    def test_forged_or_foreign_tokens_are_rejected(self):
+        token = create_token('staff')
+        self.assertIsNone(read_token(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+        self.assertIsNone(read_token(signing.dumps({'by': 'staff'})))  # signed for another purpose
+        self.assertIsNone(read_token(signing.dumps({'user': 'staff'}, salt=TOKEN_SALT)))
+        self.assertIsNone(read_token('garbage'))
+
+    def test_expired_token_is_rejected(self):
+        token = create_token('staff')
+        later = time.time() + settings.PROFILER_TOKEN_MAX_AGE + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.assertIsNone(read_token(token))
+
+    def test_token_dies_with_the_staff_flag(self):
+        token = create_token('staff')
+        get_user_model().objects.filter(pk=self.staff.pk).update(is_staff=False)
+        self.assertIsNone(read_token(token))
+        get_user_model().objects.filter(pk=self.staff.pk).update(is_staff=True, is_active=False)
+        self.assertIsNone(read_token(token))
+
+    def test_only_requests_with_a_valid_token_are_profiled(self):
+        self.assertNotIn(PROFILE_ID_HEADER, self.client.get('/api/vendors/directory/', HTTP_X_PROFILE_TOKEN='bad'))
+
+        response = self.client.get('/api/vendors/directory/', {TOKEN_PARAM: create_token('staff')})
+
+        profile_id = response[PROFILE_ID_HEADER]
+        self.assertEqual(sorted(os.listdir(self.output)), [f'{profile_id}.collapsed', f'{profile_id}.sql.json'])
+        with open(os.path.join(self.output, f'{profile_id}.sql.json')) as f:
+            self.assertEqual(json.load(f)['issued_by'], 'staff')
+
+
+class QueryFingerprintTests(SimpleTestCase):
+    def assertSameFingerprint(self, *statements):
+        self.assertEqual(len({fingerprint(sql) for sql in statements}), 1, statements)
+
+    def test_literals_and_placeholders(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t1 WHERE name = 'O''Brien' AND score > 4.5 LIMIT 21")[1],
+            'SELECT * FROM t1 WHERE name = ? AND score > ? LIMIT ?',
+        )
+        self.assertSameFingerprint(
+            'SELECT a FROM t WHERE id = %s', 'SELECT a FROM t WHERE id = ?', 'SELECT a FROM t WHERE id = 7'
+        )
+
+    def test_in_lists_of_any_length(self):
+        self.assertSameFingerprint(
+            'SELECT a FROM t WHERE id IN (%s)',
+            'SELECT a FROM t WHERE id IN (%s, %s, %s)',
+            'SELECT a FROM t WHERE id IN (1,2)',
+        )
+        self.assertEqual(fingerprint('SELECT a FROM t WHERE id IN (%s, %s)')[1], 'SELECT a FROM t WHERE id IN (...)')
+
+    def test_multi_row_inserts(self):
+        self.assertSameFingerprint(
+            'INSERT INTO t (a, b) VALUES (%s, %s)', 'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'
+        )
+        self.assertEqual(fingerprint('INSERT INTO t (a) VALUES (%s), (%s)')[1], 'INSERT INTO t (a) VALUES (...)')
+
+    def test_whitespace_and_identifiers(self):
+        self.assertSameFingerprint('SELECT a\n  FROM t\tWHERE b = 1', ' SELECT a FROM t WHERE b = 2 ')
+        # Digits inside identifiers are part of the name
+        self.assertNotEqual(fingerprint('SELECT a FROM t1')[0], fingerprint('SELECT a FROM t2')[0])
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        archive = tempfile.TemporaryDirectory()
+        self.addCleanup(archive.cleanup)
+        self.archive = archive.name
+        self.enterContext(override_settings(RETENTION_ARCHIVE_DIR=self.archive, MEDIA_ROOT=self.archive))
+        self.long_ago = timezone.now() - timezone.timedelta(days=400)
+
+    def make_user(self, n, old=True, **fields):
+        user = get_user_model().objects.create_user(
+            username=f'user{n}', email=f'user{n}@example.com', phone=f'+25192000{n:04d}', password='secret', **fields
+        )
+        if old:
+            get_user_model().objects.filter(pk=user.pk).update(date_joined=self.long_ago)
+        return user
+
+    def test_batches_follow_the_primary_key(self):
+        stale = [self.make_user(n) for n in range(5)]
+        recent = self.make_user(5, old=False)
+        verified = self.make_user(6, is_email_verified=True)
+        batches = []
+        [policy] = get_policies(['unverified_users'])
+
+        checkpoint = run_policy(
+            policy, batch_size=2, duty_cycle=1,
+            progress=lambda policy, checkpoint, moved: batches.append((moved, checkpoint.last_pk)),
+        )
+
+        self.assertEqual(batches, [(2, stale[1].pk), (2, stale[3].pk), (1, stale[4].pk)])
+        self.assertEqual((checkpoint.processed, checkpoint.last_pk), (5, stale[4].pk))
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertEqual(
+            set(get_user_model().objects.values_list('pk', flat=True)), {recent.pk, verified.pk}
+        )
+        self.assertEqual(
+            sorted(ArchivedRecord.objects.values_list('object_pk', flat=True)),
+            sorted(str(user.pk) for user in stale),
+        )
+
+    def test_passwords_are_not_archived(self):
+        user = self.make_user(1)
+        [policy] = get_policies(['unverified_users'])
+        run_policy(policy, batch_size=10, duty_cycle=1)
+
+        record = ArchivedRecord.objects.get()
+        self.assertEqual((record.model, record.object_pk), ('authenication.customuser', str(user.pk)))
+        self.assertEqual(record.data['email'], 'user1@example.com')
+        self.assertNotIn('password', record.data)
+
+    def test_interrupted_run_resumes_after_checkpoint(self):
+        stale = [self.make_user(n) for n in range(4)]
+        [policy] = get_policies(['unverified_users'])
+        calls = []
+
+        def interrupted(*args):
+            calls.append(args)
+            if len(calls) > 1:
+                raise KeyboardInterrupt
+            return _run_batch(*args)
+
+        with mock.patch('core.retention._run_batch', interrupted), self.assertRaises(KeyboardInterrupt):
+            run_policy(policy, batch_size=2, duty_cycle=1)
+        checkpoint = RetentionCheckpoint.objects.get(policy='unverified_users')
+        self.assertEqual((checkpoint.last_pk, checkpoint.processed), (stale[1].pk, 2))
+        self.assertIsNone(checkpoint.finished_at)
+        pending = report(policy)
+        self.assertEqual((pending['resuming_after'], pending['rows']), (stale[1].pk, 2))
+        self.assertEqual(pending['cutoff'], checkpoint.cutoff)
+
+        resumed = run_policy(policy, batch_size=2, duty_cycle=1)
+        self.assertEqual(resumed.pk, checkpoint.pk)
+        self.assertEqual(
+            (resumed.cutoff, resumed.started_at, resumed.processed), (checkpoint.cutoff, checkpoint.started_at, 4)
+        )
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertEqual(ArchivedRecord.objects.count(), 4)
+
+    def test_children_are_archived_with_their_parent(self):
+        user = self.make_user(1, old=False, is_email_verified=True)
+        business = BusinessProfile.objects.create(
+            user=user, business_name='Vendor', business_type='grocery', tin_number='TIN0001',
+            business_license_number='L', business_phone='0911000000', business_email=user.email,
+            verification_status='rejected',
+        )
+        BusinessProfile.objects.filter(pk=business.pk).update(updated_at=self.long_ago)
+        document = BusinessDocument(business_profile=business, document_type='business_license', document_name='License')
+        document.document_file.save('license.pdf', ContentFile(b'%PDF-1.4'))
+        path = document.document_file.path
+        [policy] = get_policies(['rejected_businesses'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkpoint = run_policy(policy, batch_size=10, duty_cycle=1)
+
+        self.assertFalse(BusinessProfile.objects.exists())
+        self.assertFalse(BusinessDocument.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        record = ArchivedRecord.objects.get()
+        self.assertEqual((record.model, record.object_pk), ('vendors.businessprofile', str(business.pk)))
+        archived = os.path.join(self.archive, 'rejected_businesses', f'{checkpoint.started_at:%Y%m%d-%H%M%S}.ndjson.gz')
+        with gzip.open(archived, 'rt', encoding='utf-8') as f:
+            [line] = f.readlines()
+        self.assertEqual(json.loads(line)['pk'], document.pk)
+        self.assertEqual(json.loads(line)['fields']['business_profile'], business.pk)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('admin/cache-stats/', views.object_cache_stats, name='object_cache_stats'),
+]
@@ -0,0 +1,20 @@
+import os
+
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from .object_cache import cache_stats
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def object_cache_stats(request):
+    """Hit/miss/eviction counters of the two-tier object caches in the worker serving this request"""
+    
+    if not request.user.is_staff:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response({
+        'pid': os.getpid(),
+        'caches': cache_stats()
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,80 @@
+"""
+Worker warmup, run from wsgi.py/asgi.py right after the application is loaded.
+
+A fresh worker otherwise pays for a lot of lazy initialisation on its first
+requests: URL pattern regexes are compiled when the resolver is first
+populated, serializer fields pull in model _meta caches, validator regexes and
+translation catalogs, and the first query has to resolve and authenticate
+against the database. warmup() does that work before the worker accepts traffic.
+
+Connections opened while warming are closed again at the end. With gunicorn
+--preload this runs in the master, whose sockets every forked worker would
+otherwise inherit, and under ASGI or threaded workers requests run in other
+threads that could never use them anyway.
+"""
+import importlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches, close_caches
+from django.db import connections
+from django.urls import get_resolver
+from django.utils import translation
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    """Populate the root resolver, compiling every pattern in backend.urls"""
+    return len(get_resolver().reverse_dict)
+
+
+def warm_serializers():
+    """Build the fields and validators of every serializer in WARMUP_SERIALIZER_MODULES"""
+    translation.activate(settings.LANGUAGE_CODE)
+    count = 0
+    for module_name in settings.WARMUP_SERIALIZER_MODULES:
+        module = importlib.import_module(module_name)
+        for obj in vars(module).values():
+            if not (isinstance(obj, type) and issubclass(obj, BaseSerializer) and obj.__module__ == module_name):
+                continue
+            serializer = obj()
+            for field in serializer.fields.values():
+                field.validators
+            serializer.validators
+            count += 1
+    return count
+
+
+def warm_connections():
+    """Connect to every database and cache once, so DNS, TLS and auth problems show up at boot"""
+    for alias in connections:
+        connections[alias].ensure_connection()
+    for alias in settings.CACHES:
+        caches[alias].get('warmup')
+    return len(settings.DATABASES)
+
+
+STEPS = (
+    ('urls', warm_urls),
+    ('serializers', warm_serializers),
+    ('connections', warm_connections),
+)
+
+
+def warmup():
+    """Run every warmup step and return {step: seconds}; failures are logged, never raised"""
+    timings = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception(f"Warmup step '{name}' failed")
+        timings[name] = time.perf_counter() - start
+    connections.close_all()
+    close_caches()
+    logger.info('Worker warmup finished: ' + ', '.join(f'{name} {seconds * 1000:.1f}ms' for name, seconds in timings.items()))
+    return timings
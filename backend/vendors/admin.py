@@ -1,3 +1,150 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
+from core.pagination import EstimatedCountPaginator
+from .caching import invalidate_business_profiles
+from .directory import invalidate_directory_cache
+from .document_review import refresh_document_counts, review_documents
+from .map_grid import add_businesses
+from .models import BusinessDocument, BusinessProfile, WebhookDelivery, WebhookEndpoint
+from .webhooks import record_status_events_for
 
-# Register your models here.
+
+class BusinessDocumentInline(admin.TabularInline):
+    model = BusinessDocument
+    extra = 0
+    fields = ('document_type', 'document_name', 'document_file', 'review_status', 'validation_status', 'uploaded_at')
+    readonly_fields = ('review_status', 'validation_status', 'uploaded_at')
+
+
+@admin.register(BusinessProfile)
+class BusinessProfileAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    list_display = ('business_name', 'user', 'business_type', 'verification_status', 'verified_by', 'created_at')
+    list_select_related = ('user', 'verified_by')
+    list_filter = ('verification_status', 'business_type')
+    search_fields = ('tin_number', 'business_name')
+    search_help_text = 'Exact TIN number or business name prefix'
+    autocomplete_fields = ('user', 'verified_by', 'review_claimed_by')
+    readonly_fields = ('verified_at', 'document_count', 'verified_document_count', 'created_at', 'updated_at')
+    inlines = [BusinessDocumentInline]
+    actions = ['approve_selected', 'reject_selected']
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline documents may have been added or deleted
+        refresh_document_counts([form.instance.pk])
+
+    def get_search_results(self, request, queryset, search_term):
+        # Autocomplete renders __str__, which needs the owner
+        queryset = queryset.select_related('user')
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return (
+            queryset.filter(tin_number=search_term) | queryset.filter(business_name__startswith=search_term)
+        ), False
+
+    @admin.action(description='Approve selected businesses')
+    @transaction.atomic
+    def approve_selected(self, request, queryset):
+        # Rows already approved keep their verified_at/verified_by, and subscribers do not hear about them again
+        newly_approved = list(
+            queryset.exclude(verification_status='approved').select_for_update().values_list('id', flat=True)
+        )
+        updated = BusinessProfile.objects.filter(id__in=newly_approved).update(
+            verification_status='approved',
+            verified_at=timezone.now(),
+            verified_by=request.user,
+            review_claimed_by=None,
+            review_lease_expires_at=None,
+            updated_at=timezone.now(),
+        )
+        add_businesses(newly_approved, 1)
+        record_status_events_for(newly_approved)
+        invalidate_business_profiles(newly_approved)
+        invalidate_directory_cache()
+        self.message_user(request, f'{updated} businesses approved.', messages.SUCCESS)
+
+    @admin.action(description='Reject selected businesses')
+    @transaction.atomic
+    def reject_selected(self, request, queryset):
+        changing = dict(
+            queryset.exclude(verification_status='rejected').select_for_update()
+            .values_list('id', 'verification_status')
+        )
+        updated = BusinessProfile.objects.filter(id__in=changing).update(
+            verification_status='rejected',
+            review_claimed_by=None,
+            review_lease_expires_at=None,
+            updated_at=timezone.now(),
+        )
+        add_businesses([business_id for business_id, status in changing.items() if status == 'approved'], -1)
+        record_status_events_for(list(changing))
+        invalidate_business_profiles(list(changing))
+        invalidate_directory_cache()
+        self.message_user(request, f'{updated} businesses rejected.', messages.SUCCESS)
+
+
+@admin.register(BusinessDocument)
+class BusinessDocumentAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    list_display = ('document_name', 'business_profile', 'document_type', 'review_status', 'validation_status', 'uploaded_at')
+    # __str__ of the profile shows the owner's username
+    list_select_related = ('business_profile__user',)
+    list_filter = ('document_type', 'review_status', 'validation_status')
+    autocomplete_fields = ('business_profile',)
+    readonly_fields = (
+        'is_verified', 'review_status', 'rejection_reason', 'reviewed_at', 'reviewed_by',
+        'file_size', 'detected_format', 'validation_status', 'validation_notes', 'validated_at', 'uploaded_at'
+    )
+    ordering = ('-id',)
+    actions = ['mark_verified', 'mark_rejected']
+
+    def save_model(self, request, obj, form, change):
+        previous_profile_id = form.initial.get('business_profile')
+        super().save_model(request, obj, form, change)
+        refresh_document_counts({obj.business_profile_id, previous_profile_id} - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_document_counts([obj.business_profile_id])
+
+    def delete_queryset(self, request, queryset):
+        profile_ids = list(queryset.order_by().values_list('business_profile_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        refresh_document_counts(profile_ids)
+
+    @admin.action(description='Mark selected documents as verified')
+    def mark_verified(self, request, queryset):
+        updated, _ = review_documents(request.user, list(queryset.values_list('id', flat=True)), 'verified')
+        self.message_user(request, f'{updated} documents marked as verified.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected documents as rejected')
+    def mark_rejected(self, request, queryset):
+        updated, _ = review_documents(
+            request.user, list(queryset.values_list('id', flat=True)), 'rejected', 'Rejected from the admin'
+        )
+        self.message_user(request, f'{updated} documents marked as rejected.', messages.SUCCESS)
+
+
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'url', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    list_display = ('event', 'endpoint', 'status', 'attempts', 'next_attempt_at', 'delivered_at')
+    list_select_related = ('event', 'endpoint')
+    list_filter = ('status',)
+    readonly_fields = ('event', 'endpoint', 'attempts', 'delivered_at', 'last_error')
+    ordering = ('-id',)
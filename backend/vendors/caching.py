@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from core.object_cache import ModelCache
+from .models import BusinessProfile
+
+# Business profiles by owner, read by verification status polls. Code that changes
+# profiles with a bulk UPDATE must call invalidate_business_profiles().
+business_profile_cache = ModelCache(BusinessProfile, 'user_id')
+
+
+def invalidate_business_profiles(profile_ids):
+    for user_id in BusinessProfile.objects.filter(id__in=profile_ids).values_list('user_id', flat=True):
+        business_profile_cache.invalidate(user_id)
+
+
+@receiver(post_save, sender=BusinessProfile)
+@receiver(post_delete, sender=BusinessProfile)
+def invalidate_cached_business_profile(sender, instance, **kwargs):
+    business_profile_cache.invalidate(instance.user_id)
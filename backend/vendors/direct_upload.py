@@ -0,0 +1,230 @@
+"""
+Direct document uploads, served outside the Django request stack.
+
+create_document_upload_url hands out a short-lived signed URL bound to one
+business and document type. The client PUTs the raw file to it. The URL is
+served by the small ASGI app below, which asgi.py mounts at DIRECT_UPLOAD_PATH
+in front of Django. It skips middleware, sessions, auth and DRF parsing. The
+same format and size checks as the multipart endpoint run on the stream. The
+file is spooled to a temporary file and handed to storage, which moves it on
+local disk. complete_direct_upload then creates the BusinessDocument row and
+runs the usual validation.
+
+Each URL can be used for one successful upload: the document row stores the
+URL's key under a unique constraint, which holds across every worker. URLs are
+only issued by processes that mounted the handler, i.e. the ASGI entry point.
+"""
+import asyncio
+import json
+import uuid
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from .document_review import document_stored
+from .document_validation import SNIFF_LENGTH, get_upload_limits, sniff_format
+from .models import BusinessDocument, BusinessProfile
+
+TOKEN_SALT = 'vendors.direct_upload'
+EXTENSIONS = {'pdf': '.pdf', 'png': '.png', 'jpeg': '.jpg'}
+
+_handler_mounted = False
+
+
+class UploadURLUsed(Exception):
+    pass
+
+
+def direct_uploads_enabled():
+    """True once with_direct_uploads has mounted the handler; under WSGI nothing serves DIRECT_UPLOAD_PATH"""
+    return _handler_mounted
+
+
+def create_upload_token(business_profile, document_type, document_name):
+    return signing.dumps(
+        {'b': business_profile.id, 't': document_type, 'n': document_name, 'k': uuid.uuid4().hex},
+        salt=TOKEN_SALT,
+    )
+
+
+def read_upload_token(token):
+    """Return the claims of a valid, unexpired upload token, else None"""
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=settings.DIRECT_UPLOAD_URL_TTL)
+    except signing.BadSignature:
+        return None
+
+
+def upload_url(request, token):
+    path = f'{settings.DIRECT_UPLOAD_PATH}{token}'
+    if settings.DIRECT_UPLOAD_BASE_URL:
+        return f"{settings.DIRECT_UPLOAD_BASE_URL.rstrip('/')}{path}"
+    return request.build_absolute_uri(path)
+
+
+def complete_direct_upload(claims, upload, file_format):
+    """Completion callback: store the spooled file and create its BusinessDocument"""
+    business_profile = BusinessProfile.objects.filter(id=claims['b']).first()
+    if business_profile is None:
+        return None, 'Business profile no longer exists.'
+    if business_profile.verification_status == 'approved':
+        return None, 'Business is already verified. No additional documents needed.'
+
+    document = BusinessDocument(
+        business_profile=business_profile,
+        document_type=claims['t'],
+        document_name=claims['n'],
+        file_size=upload.size,
+        detected_format=file_format,
+        upload_key=claims['k'],
+    )
+    document.document_file.save(f"{claims['k']}{EXTENSIONS[file_format]}", upload, save=False)
+    try:
+        with transaction.atomic():
+            document.save()
+    except IntegrityError:
+        # A concurrent upload through the same URL won
+        document.document_file.delete(save=False)
+        raise UploadURLUsed()
+    document_stored(business_profile, document)
+    return document, None
+
+
+def upload_url_used(claims):
+    return BusinessDocument.objects.filter(upload_key=claims['k']).exists()
+
+
+def _in_thread(function):
+    """Wrap a database call made from the upload's own thread, which goes away afterwards"""
+    def wrapper(*args):
+        # Do what request_started/finished would
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            connections.close_all()
+    return wrapper
+
+
+async def _off_loop(function, *args):
+    """Run blocking file work in the default executor so a slow disk never stalls the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+async def _respond(send, status_code, data, headers=()):
+    body = json.dumps(data).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class DirectUploadApp:
+    """ASGI app for PUT <DIRECT_UPLOAD_PATH><token>"""
+
+    def __init__(self):
+        self.active = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] != 'PUT':
+            return await _respond(send, 405, {'error': 'Method not allowed'}, [(b'allow', b'PUT')])
+        if self.active >= settings.DIRECT_UPLOAD_MAX_CONCURRENCY:
+            return await _respond(send, 503, {'error': 'Server is busy, please retry shortly'}, [(b'retry-after', b'5')])
+
+        self.active += 1
+        try:
+            async with ThreadSensitiveContext():
+                await self.handle(scope, receive, send)
+        finally:
+            self.active -= 1
+
+    async def handle(self, scope, receive, send):
+        claims = read_upload_token(scope['path'][len(settings.DIRECT_UPLOAD_PATH):])
+        if claims is None:
+            return await _respond(send, 403, {'error': 'Upload URL is invalid or has expired'})
+
+        limits = get_upload_limits(claims['t'])
+        max_mb = limits['max_size'] // (1024 * 1024)
+        headers = dict(scope['headers'])
+        content_length = headers.get(b'content-length')
+        if content_length is not None:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                content_length = -1
+            if content_length < 0:
+                return await _respond(send, 400, {'error': 'Invalid Content-Length header'})
+            if content_length > limits['max_size']:
+                return await _respond(send, 413, {'error': f'File is larger than {max_mb} MB.'})
+
+        # Cheap early refusal; the unique upload_key decides races when the document is saved
+        if await sync_to_async(_in_thread(upload_url_used))(claims):
+            return await _respond(send, 409, {'error': 'Upload URL has already been used'})
+
+        content_type = headers.get(b'content-type', b'application/octet-stream').decode('latin-1')
+        upload = await _off_loop(TemporaryUploadedFile, claims['n'], content_type, 0, None)
+        try:
+            head = b''
+            file_format = None
+            received = 0
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                chunk = message.get('body', b'')
+                more_body = message.get('more_body', False)
+
+                received += len(chunk)
+                if received > limits['max_size']:
+                    return await _respond(send, 413, {'error': f'File is larger than {max_mb} MB.'})
+                if file_format is None:
+                    head += chunk[:SNIFF_LENGTH]
+                    if len(head) >= SNIFF_LENGTH or not more_body:
+                        file_format = sniff_format(head)
+                        if file_format not in limits['formats']:
+                            return await _respond(send, 415, {
+                                'error': f"Unsupported file format. Allowed: {', '.join(limits['formats'])}."
+                            })
+                await _off_loop(upload.write, chunk)
+
+            upload.size = received
+            await _off_loop(upload.seek, 0)
+            try:
+                document, error = await sync_to_async(_in_thread(complete_direct_upload))(claims, upload, file_format)
+            except UploadURLUsed:
+                return await _respond(send, 409, {'error': 'Upload URL has already been used'})
+        finally:
+            await _off_loop(upload.close)
+
+        if error:
+            return await _respond(send, 400, {'error': error})
+        await _respond(send, 201, {
+            'message': 'Document uploaded successfully',
+            'document_id': document.id,
+            'document_type': document.document_type,
+            'validation_status': document.validation_status,
+            'validation_notes': document.validation_notes,
+        })
+
+
+def with_direct_uploads(django_application):
+    """Route DIRECT_UPLOAD_PATH to DirectUploadApp and everything else to Django"""
+    global _handler_mounted
+    _handler_mounted = True
+    upload_app = DirectUploadApp()
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(settings.DIRECT_UPLOAD_PATH):
+            return await upload_app(scope, receive, send)
+        return await django_application(scope, receive, send)
+
+    return application
@@ -0,0 +1,95 @@
+"""
+Public directory of approved businesses.
+
+Pages are keyset-paginated on (created_at, id) so deep pages cost the same as
+the first one, and each page is cached in DIRECTORY_CACHE, which every worker
+shares. All cached pages share a version token that is replaced whenever a
+visible business changes, which invalidates every page at once without having
+to know which pages contained the business. Tokens are random, so a culled
+version key can never bring back pages stored under an older one.
+"""
+import base64
+import binascii
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from .models import BusinessProfile
+
+VERSION_KEY = 'directory:version'
+
+PUBLIC_FIELDS = [
+    'id', 'business_name', 'business_type', 'business_description', 'business_address',
+    'business_phone', 'business_email', 'location_lat', 'location_lng', 'created_at',
+]
+
+
+def _cache():
+    return caches[settings.DIRECTORY_CACHE]
+
+
+def _version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY) or version
+    return version
+
+
+def _bump_version():
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_directory_cache():
+    """Make every cached directory page stale once the current transaction commits"""
+    # Bumping earlier would let a concurrent reader cache the rows as they were before the commit
+    transaction.on_commit(_bump_version)
+
+
+def page_cache_key(business_type, position, page_size):
+    """Cache key of a page; keyed by the decoded position so client-supplied strings never reach the cache"""
+    if position:
+        created_at, business_id = position
+        start = hashlib.sha1(f'{created_at.isoformat()}|{business_id}'.encode()).hexdigest()
+    else:
+        start = 'first'
+    return f'directory:v{_version()}:{business_type or "all"}:{start}:{page_size}'
+
+
+def encode_cursor(business):
+    raw = f'{business.created_at.isoformat()}|{business.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) or None if the cursor is malformed"""
+    try:
+        created_at, business_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        business_id = int(business_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, business_id
+
+
+def directory_page(business_type, position, page_size):
+    """One page of approved businesses, newest first, plus whether more exist"""
+    queryset = BusinessProfile.objects.filter(verification_status='approved')
+    if business_type:
+        queryset = queryset.filter(business_type=business_type)
+    if position:
+        created_at, business_id = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=business_id)
+        )
+    # Fetch one extra row to learn whether there is a next page without a COUNT
+    businesses = list(queryset.only(*PUBLIC_FIELDS).order_by('-created_at', '-id')[:page_size + 1])
+    return businesses[:page_size], len(businesses) > page_size
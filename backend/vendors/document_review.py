@@ -0,0 +1,93 @@
+"""
+Staff review of individual business documents.
+
+Reviews are applied as bulk UPDATEs, and the per-business document counters
+and the optional auto-approval are updated in the same transaction.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .caching import invalidate_business_profiles
+from .directory import invalidate_directory_cache
+from .document_validation import run_deep_validation
+from .map_grid import add_businesses
+from .webhooks import record_status_events_for
+from .models import BusinessDocument, BusinessProfile
+
+DECISIONS = ['verified', 'rejected']
+
+
+def refresh_document_counts(profile_ids):
+    """Recompute document_count/verified_document_count with one UPDATE"""
+    counts = BusinessDocument.objects.filter(
+        business_profile=OuterRef('pk')
+    ).order_by().values('business_profile').annotate(
+        total=Count('id'), verified=Count('id', filter=Q(is_verified=True))
+    )
+    BusinessProfile.objects.filter(id__in=profile_ids).update(
+        document_count=Coalesce(Subquery(counts.values('total'), output_field=IntegerField()), 0),
+        verified_document_count=Coalesce(Subquery(counts.values('verified'), output_field=IntegerField()), 0),
+    )
+    invalidate_business_profiles(profile_ids)
+
+
+def document_stored(business_profile, document):
+    """Validate a newly stored document, refresh the counters and move a pending business to under_review"""
+    run_deep_validation(document)
+    refresh_document_counts([business_profile.id])
+    if business_profile.verification_status == 'pending':
+        business_profile.verification_status = 'under_review'
+        business_profile.save(update_fields=['verification_status', 'updated_at'])
+
+
+def approve_completed_businesses(profile_ids, reviewer, now):
+    """Approve businesses that have a verified document of every required type"""
+    completed = BusinessProfile.objects.filter(
+        id__in=profile_ids, verification_status__in=['pending', 'under_review']
+    )
+    for document_type in settings.REQUIRED_DOCUMENT_TYPES:
+        completed = completed.filter(Exists(BusinessDocument.objects.filter(
+            business_profile=OuterRef('pk'), document_type=document_type, is_verified=True
+        )))
+
+    approved_ids = list(completed.values_list('id', flat=True))
+    BusinessProfile.objects.filter(id__in=approved_ids).update(
+        verification_status='approved',
+        verified_at=now,
+        verified_by=reviewer,
+        review_claimed_by=None,
+        review_lease_expires_at=None,
+        updated_at=now,
+    )
+    if approved_ids:
+        add_businesses(approved_ids, 1)
+        record_status_events_for(approved_ids)
+        invalidate_business_profiles(approved_ids)
+        invalidate_directory_cache()
+    return approved_ids
+
+
+def review_documents(reviewer, document_ids, decision, reason='', auto_approve=False):
+    """
+    Mark documents verified or rejected.
+
+    Returns (number of documents updated, ids of businesses that were auto-approved).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        documents = BusinessDocument.objects.filter(id__in=document_ids)
+        profile_ids = list(documents.order_by().values_list('business_profile_id', flat=True).distinct())
+        updated = documents.update(
+            review_status=decision,
+            is_verified=decision == 'verified',
+            rejection_reason=reason if decision == 'rejected' else '',
+            reviewed_at=now,
+            reviewed_by=reviewer,
+        )
+        refresh_document_counts(profile_ids)
+        approved_ids = []
+        if auto_approve and decision == 'verified':
+            approved_ids = approve_completed_businesses(profile_ids, reviewer, now)
+    return updated, approved_ids
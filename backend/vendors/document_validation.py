@@ -0,0 +1,391 @@
+"""
+Validation of uploaded business documents.
+
+Cheap checks (magic bytes, size) run while the upload is streaming in, so a
+bad or oversized file is dropped before it is written to disk. Per document
+type limits are applied in DocumentUploadSerializer once the document_type
+field is known. Structural checks that have to read the whole file run in a
+process pool after the upload has been answered, and their result (or a
+timeout) is stored on the document.
+"""
+import logging
+import multiprocessing
+import re
+import struct
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework.parsers import MultiPartParser
+
+logger = logging.getLogger(__name__)
+
+SNIFF_LENGTH = 16
+
+MAGIC_NUMBERS = [
+    (b'%PDF-', 'pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+]
+
+
+def sniff_format(head):
+    """Return the file format from its first bytes, or None if it is not supported"""
+    for magic, file_format in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return file_format
+    return None
+
+
+def get_upload_limits(document_type):
+    """Limits for a document type, falling back to the 'default' entry"""
+    limits = dict(settings.DOCUMENT_UPLOAD_LIMITS['default'])
+    limits.update(settings.DOCUMENT_UPLOAD_LIMITS.get(document_type, {}))
+    return limits
+
+
+def _absolute_limits():
+    """The loosest limits over all document types, usable before document_type is known"""
+    max_size = 0
+    formats = set()
+    for document_type in settings.DOCUMENT_UPLOAD_LIMITS:
+        limits = get_upload_limits(document_type)
+        max_size = max(max_size, limits['max_size'])
+        formats.update(limits['formats'])
+    return max_size, formats
+
+
+def get_upload_errors(request):
+    """Errors recorded by DocumentUploadHandler for files it rejected mid-stream"""
+    return getattr(request, 'upload_errors', None) or {}
+
+
+class DocumentUploadHandler(FileUploadHandler):
+    """
+    Reject unsupported or oversized files while they are streaming in.
+
+    Must run first in the handler chain; it passes chunks through untouched and
+    lets the next handler build the uploaded file.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size, self.formats = _absolute_limits()
+        self.too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # The body is bigger than any file we accept, no need to look at it
+        self.too_large = content_length > self.max_size + 64 * 1024
+
+    def _reject(self, message):
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = [message]
+        raise SkipFile()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        if self.too_large:
+            self._reject(f'File is larger than {self.max_size // (1024 * 1024)} MB.')
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and sniff_format(raw_data[:SNIFF_LENGTH]) not in self.formats:
+            self._reject('Unsupported file format. Upload a PDF, PNG or JPEG file.')
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self._reject(f'File is larger than {self.max_size // (1024 * 1024)} MB.')
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class DocumentUploadParser(MultiPartParser):
+    """Multipart parser that validates document uploads while they stream"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers.insert(0, DocumentUploadHandler(request._request))
+        return super().parse(stream, media_type, parser_context)
+
+
+# Deep checks. These run in worker processes and must not touch Django.
+
+PDF_WHITESPACE = b' \t\r\n\f\x00'
+PDF_PAGES_RE = re.compile(rb'/Type\s*/Pages(?![a-zA-Z])')
+PDF_COUNT_RE = re.compile(rb'/Count\s+(\d+)')
+PDF_INT_RE = re.compile(rb'/(N|First)\s+(\d+)')
+PDF_MAX_OBJECTS = 100_000
+PDF_MAX_OBJECT_SIZE = 16 * 1024 * 1024
+PDF_MAX_INFLATE = 64 * 1024 * 1024
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _is_object_header(data, start):
+    """Whether the 'obj' keyword at `start` follows an object and generation number"""
+    position = start
+    for run in (PDF_WHITESPACE, b'0123456789', PDF_WHITESPACE, b'0123456789'):
+        end = position
+        while position > 0 and data[position - 1] in run:
+            position -= 1
+        if position == end:
+            return False
+    return True
+
+
+def _pdf_top_level_objects(data):
+    """
+    Bodies between 'N G obj' and the next 'endobj', in one linear pass.
+
+    Each search starts after the previous match, so unterminated objects cannot
+    make the scan quadratic. Objects over PDF_MAX_OBJECT_SIZE are skipped and
+    at most PDF_MAX_OBJECTS are returned.
+    """
+    position = 0
+    found = 0
+    while found < PDF_MAX_OBJECTS:
+        start = data.find(b'obj', position)
+        if start == -1:
+            return
+        body_start = start + 3
+        if data[body_start:body_start + 1].isalnum() or not _is_object_header(data, start):
+            position = body_start
+            continue
+        end = data.find(b'endobj', body_start)
+        if end == -1:
+            return
+        position = end + 6
+        if end - body_start <= PDF_MAX_OBJECT_SIZE:
+            found += 1
+            yield data[body_start:end]
+
+
+def _pdf_stream(body):
+    """Raw content of the stream in an object body, or None"""
+    start = body.find(b'stream')
+    end = body.rfind(b'endstream')
+    if start == -1 or end < start:
+        return None
+    start += 6
+    if body[start:start + 1] == b'\r':
+        start += 1
+    if body[start:start + 1] == b'\n':
+        start += 1
+    return body[start:end]
+
+
+def _pdf_objects(data):
+    """Bodies of the top-level objects and of the objects packed in object streams (PDF 1.5+)"""
+    for body in _pdf_top_level_objects(data):
+        yield body
+        if b'/ObjStm' not in body or b'/FlateDecode' not in body:
+            continue
+        stream = _pdf_stream(body)
+        ints = dict(PDF_INT_RE.findall(body.split(b'stream', 1)[0]))
+        if stream is None or b'First' not in ints:
+            continue
+        try:
+            content = zlib.decompressobj().decompress(stream, PDF_MAX_INFLATE)
+        except zlib.error:
+            continue
+        first = int(ints[b'First'])
+        offsets = [int(n) for n in content[:first].split()[1::2]]
+        for start, end in zip(offsets, offsets[1:] + [len(content) - first]):
+            yield content[first + start:first + end]
+
+
+def _pdf_page_count(data):
+    """/Count of the page tree root, the largest one over all /Pages nodes; None if not found"""
+    counts = [
+        int(count)
+        for body in _pdf_objects(data) if PDF_PAGES_RE.search(body)
+        for count in PDF_COUNT_RE.findall(body)
+    ]
+    return max(counts) if counts else None
+
+
+def _check_pdf(data, limits):
+    if b'%%EOF' not in data[-2048:]:
+        return ['PDF is truncated or corrupt (missing %%EOF).'], {}
+    pages = _pdf_page_count(data)
+    errors = []
+    if pages == 0:
+        errors.append('PDF has no pages.')
+    elif pages is not None and pages > limits['max_pages']:
+        errors.append(f"PDF has {pages} pages, the limit is {limits['max_pages']}.")
+    if b'/Encrypt' in data:
+        errors.append('PDF is password protected.')
+    # An unusual page tree is not a reason to reject the file
+    return errors, {'pages': pages if pages is not None else 'unknown'}
+
+
+def _png_dimensions(data):
+    if data[12:16] != b'IHDR' or not data.rstrip(b'\x00').endswith(b'IEND\xaeB`\x82'):
+        return None
+    return struct.unpack('>II', data[16:24])
+
+
+def _jpeg_dimensions(data):
+    if not data.rstrip(b'\x00').endswith(b'\xff\xd9'):
+        return None
+    position = 2
+    while position + 9 < len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return width, height
+        segment_length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        position += 2 + segment_length
+    return None
+
+
+def _check_image(data, file_format, limits):
+    dimensions = _png_dimensions(data) if file_format == 'png' else _jpeg_dimensions(data)
+    if dimensions is None:
+        return ['Image is truncated or corrupt.'], {}
+    width, height = dimensions
+    errors = []
+    if min(width, height) < limits['min_image_side']:
+        errors.append(f"Image is {width}x{height}, too small to read (minimum side {limits['min_image_side']}px).")
+    if width * height > limits['max_image_pixels']:
+        errors.append(f'Image is {width}x{height}, which is too large.')
+    return errors, {'width': width, 'height': height}
+
+
+def inspect_document(path, file_format, limits):
+    """Run structural checks on a stored document; returns (errors, details)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if file_format == 'pdf':
+        return _check_pdf(data, limits)
+    return _check_image(data, file_format, limits)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a worker that holds DB connections and threads is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.DOCUMENT_VALIDATION_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _reset_executor(executor, terminate=False):
+    """Stop using `executor`, the next submission starts a fresh pool; `terminate` kills its workers"""
+    global _executor
+    with _executor_lock:
+        # Several failing futures may report the same pool, only the first one replaces it
+        if _executor is executor:
+            _executor = None
+    if terminate:
+        # Pools have no public way to stop a running task. Killing the workers breaks the
+        # pool, and the other checks that were running in it are submitted again.
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _record_result(document_id, errors, details):
+    """Store the outcome unless another one (result or timeout) was stored first"""
+    from .models import BusinessDocument  # imported late, worker processes load this module without Django
+
+    BusinessDocument.objects.filter(id=document_id, validation_status='pending').update(
+        validation_status='failed' if errors else 'passed',
+        validation_notes=' '.join(errors) or ', '.join(f'{k}: {v}' for k, v in details.items()),
+        validated_at=timezone.now(),
+    )
+
+
+def _record_in_thread(document_id, errors, details):
+    # Called from the pool's and the timers' threads, which Django's request signals never clean up
+    try:
+        _record_result(document_id, errors, details)
+    except Exception as e:
+        logger.error(f"Could not record validation of document {document_id}: {e}")
+    finally:
+        connections.close_all()
+
+
+def _validation_timed_out(document_id, executor, future):
+    if future.done():
+        return
+    future.timed_out = True
+    _reset_executor(executor, terminate=True)
+    _record_in_thread(document_id, ['Validation timed out.'], {})
+
+
+def _validation_done(document_id, timer, executor, future, check, retry):
+    timer.cancel()
+    if getattr(future, 'timed_out', False):
+        return
+    if future.cancelled() or isinstance(future.exception(), BrokenProcessPool):
+        # The pool went away under this check: a worker died (e.g. OOM on a hostile file)
+        # or was killed because another check timed out. Try once more in a fresh pool.
+        _reset_executor(executor)
+        if retry:
+            _submit_validation(document_id, *check, retry=False)
+            return
+        errors, details = ['Document could not be validated.'], {}
+    elif future.exception() is not None:
+        logger.error(f"Document validation failed for document {document_id}: {future.exception()}")
+        errors, details = ['Document could not be validated.'], {}
+    else:
+        errors, details = future.result()
+    _record_in_thread(document_id, errors, details)
+
+
+def _submit_validation(document_id, path, file_format, limits, retry=True):
+    check = (path, file_format, limits)
+    executor = _get_executor()
+    try:
+        future = executor.submit(inspect_document, *check)
+    except (BrokenProcessPool, RuntimeError):
+        # Broken, or shut down by a concurrent reset
+        _reset_executor(executor)
+        if retry:
+            _submit_validation(document_id, *check, retry=False)
+        else:
+            _record_in_thread(document_id, ['Document could not be validated.'], {})
+        return
+    timer = threading.Timer(
+        settings.DOCUMENT_VALIDATION_TIMEOUT, _validation_timed_out, (document_id, executor, future)
+    )
+    timer.daemon = True
+    timer.start()
+    future.add_done_callback(
+        lambda future: _validation_done(document_id, timer, executor, future, check, retry)
+    )
+
+
+def run_deep_validation(document):
+    """
+    Queue the stored file for checking in the process pool once the transaction commits.
+
+    The request does not wait: validation_status stays 'pending' until the
+    result, or 'Validation timed out.' after DOCUMENT_VALIDATION_TIMEOUT, is recorded.
+    A check that times out has its worker killed.
+    """
+    try:
+        path = document.document_file.path
+    except NotImplementedError:
+        # Storage without local paths; the header checks already ran
+        _record_result(document.id, [], {'deep_checks': 'skipped'})
+        return document
+    limits = get_upload_limits(document.document_type)
+    transaction.on_commit(lambda: _submit_validation(document.id, path, document.detected_format, limits))
+    return document
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from vendors.webhooks import dispatch_pending, get_pool
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued business verification webhooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events')
+        parser.add_argument('--interval', type=float, default=settings.WEBHOOK_POLL_SECONDS,
+                            help='Seconds to sleep when there is nothing to send')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                delivered, failed = dispatch_pending()
+                if delivered or failed:
+                    self.stdout.write(f'Delivered {delivered}, failed {failed}')
+                if not options['loop']:
+                    break
+                if not (delivered or failed):
+                    time.sleep(options['interval'])
+        finally:
+            get_pool().close()
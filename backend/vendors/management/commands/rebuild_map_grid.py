@@ -0,0 +1,44 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from vendors.map_grid import cell_coordinates, cell_zooms, map_state
+from vendors.models import BusinessProfile, VendorMapCell
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the vendor map grid from approved businesses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cells = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+        businesses = BusinessProfile.objects.filter(
+            verification_status='approved', location_lat__isnull=False, location_lng__isnull=False
+        ).values_list('verification_status', 'location_lat', 'location_lng', 'business_type')
+
+        total = 0
+        for row in businesses.iterator(chunk_size=options['batch_size']):
+            lat, lng, business_type = map_state(*row)
+            for zoom in cell_zooms():
+                x, y = cell_coordinates(lat, lng, zoom)
+                for type_key in (business_type, ''):
+                    cell = cells[(zoom, x, y, type_key)]
+                    cell[0] += 1
+                    cell[1] += lat
+                    cell[2] += lng
+            total += 1
+
+        with transaction.atomic():
+            VendorMapCell.objects.all().delete()
+            VendorMapCell.objects.bulk_create(
+                (
+                    VendorMapCell(zoom=zoom, x=x, y=y, business_type=type_key, count=count, lat_sum=lat_sum, lng_sum=lng_sum)
+                    for (zoom, x, y, type_key), (count, lat_sum, lng_sum) in cells.items()
+                ),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(cells)} cells from {total} businesses'))
@@ -0,0 +1,128 @@
+"""
+Multi-resolution grid of approved business locations for clustered map tiles.
+
+A map tile at zoom z is split into 2**MAP_CELL_SHIFT x 2**MAP_CELL_SHIFT cells,
+which are exactly the Web Mercator tiles at zoom z + MAP_CELL_SHIFT. Every
+approved business with a location is counted in one cell per zoom level, once
+for its business_type and once in the all-types total, so serving a tile reads
+a bounded number of rows no matter how many businesses it covers. Counts are
+adjusted incrementally when a business is approved, leaves approval, moves or
+changes type.
+"""
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from .models import BusinessProfile, VendorMapCell
+
+MAX_LATITUDE = 85.05112878
+COORDINATE_PLACES = Decimal('1e-8')  # matches the location fields and VendorMapCell sums
+
+
+def cell_coordinates(lat, lng, zoom):
+    """Web Mercator tile x/y containing the point at the given zoom"""
+    lat, lng = float(lat), float(lng)
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    n = 2 ** zoom
+    x = int((lng + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def cell_zooms():
+    shift = settings.MAP_CELL_SHIFT
+    return range(shift, settings.MAP_TILE_MAX_ZOOM + shift + 1)
+
+
+def coordinate(value):
+    return Decimal(str(value)).quantize(COORDINATE_PLACES)
+
+
+def map_state(status, lat, lng, business_type):
+    """The (lat, lng, business_type) a business contributes to the grid, or None"""
+    if status != 'approved' or lat is None or lng is None:
+        return None
+    return coordinate(lat), coordinate(lng), business_type
+
+
+def adjust_cells(state, delta):
+    """Add (delta=1) or remove (delta=-1) one business from every level of the grid"""
+    lat, lng, business_type = state
+    keys = []
+    for zoom in cell_zooms():
+        x, y = cell_coordinates(lat, lng, zoom)
+        for type_key in (business_type, ''):
+            keys.append((zoom, x, y, type_key))
+
+    lookup = Q()
+    for zoom, x, y, type_key in keys:
+        lookup |= Q(zoom=zoom, x=x, y=y, business_type=type_key)
+
+    with transaction.atomic():
+        # Make sure every cell exists, then shift them all with one UPDATE
+        VendorMapCell.objects.bulk_create(
+            [VendorMapCell(zoom=zoom, x=x, y=y, business_type=type_key) for zoom, x, y, type_key in keys],
+            ignore_conflicts=True,
+        )
+        # Low zoom cells are shared by every business, lock in one global order so concurrent saves cannot deadlock
+        cell_ids = list(
+            VendorMapCell.objects.filter(lookup).order_by('zoom', 'business_type', 'x', 'y')
+            .select_for_update().values_list('id', flat=True)
+        )
+        VendorMapCell.objects.filter(id__in=cell_ids).update(
+            count=F('count') + delta,
+            lat_sum=F('lat_sum') + lat * delta,
+            lng_sum=F('lng_sum') + lng * delta,
+        )
+
+
+def sync_business(old_state, new_state):
+    """Move a business's contribution from old_state to new_state"""
+    if old_state == new_state:
+        return
+    if old_state is not None:
+        adjust_cells(old_state, -1)
+    if new_state is not None:
+        adjust_cells(new_state, 1)
+
+
+def add_businesses(business_ids, delta):
+    """Count (or uncount) businesses changed by a bulk UPDATE that skipped save()"""
+    rows = BusinessProfile.objects.filter(
+        id__in=business_ids, location_lat__isnull=False, location_lng__isnull=False
+    ).values_list('location_lat', 'location_lng', 'business_type')
+    for lat, lng, business_type in rows:
+        adjust_cells((coordinate(lat), coordinate(lng), business_type), delta)
+
+
+def tile_cells(zoom, x, y, business_type=None, split=False):
+    """Cluster cells inside one map tile"""
+    shift = settings.MAP_CELL_SHIFT
+    size = 2 ** shift
+    cells = VendorMapCell.objects.filter(
+        zoom=zoom + shift,
+        x__gte=x * size, x__lt=(x + 1) * size,
+        y__gte=y * size, y__lt=(y + 1) * size,
+        count__gt=0,
+    )
+    if business_type:
+        cells = cells.filter(business_type=business_type)
+    elif split:
+        cells = cells.exclude(business_type='')
+    else:
+        cells = cells.filter(business_type='')
+
+    return [
+        {
+            'x': cell.x,
+            'y': cell.y,
+            'count': cell.count,
+            'lat': float(cell.lat_sum / cell.count),
+            'lng': float(cell.lng_sum / cell.count),
+            **({'business_type': cell.business_type} if cell.business_type else {}),
+        }
+        for cell in cells.order_by('y', 'x')
+    ]
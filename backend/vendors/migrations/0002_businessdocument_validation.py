@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessdocument',
+            name='detected_format',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='validated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='validation_notes',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='validation_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('passed', 'Passed'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0002_businessdocument_validation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='businessdocument',
+            index=models.Index(fields=['document_type'], name='document_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessdocument',
+            index=models.Index(fields=['is_verified'], name='document_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessdocument',
+            index=models.Index(fields=['validation_status'], name='document_validation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessprofile',
+            index=models.Index(fields=['-created_at'], name='business_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessprofile',
+            index=models.Index(fields=['verification_status', '-created_at'], name='business_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessprofile',
+            index=models.Index(fields=['business_type', '-created_at'], name='business_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessprofile',
+            index=models.Index(fields=['business_name'], name='business_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0003_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessprofile',
+            name='review_claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_businesses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='businessprofile',
+            name='review_lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
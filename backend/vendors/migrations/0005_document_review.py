@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_review_state(apps, schema_editor):
+    BusinessDocument = apps.get_model('vendors', 'BusinessDocument')
+    BusinessProfile = apps.get_model('vendors', 'BusinessProfile')
+    BusinessDocument.objects.filter(is_verified=True).update(review_status='verified')
+    counts = BusinessDocument.objects.filter(
+        business_profile=OuterRef('pk')
+    ).order_by().values('business_profile').annotate(
+        total=Count('id'), verified=Count('id', filter=Q(is_verified=True))
+    )
+    BusinessProfile.objects.update(
+        document_count=Coalesce(Subquery(counts.values('total'), output_field=IntegerField()), 0),
+        verified_document_count=Coalesce(Subquery(counts.values('verified'), output_field=IntegerField()), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0004_businessprofile_review_lease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='businessdocument',
+            name='document_verified_idx',
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='rejection_reason',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='review_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('rejected', 'Rejected')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='reviewed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='businessdocument',
+            name='reviewed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_documents', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='businessprofile',
+            name='document_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='businessprofile',
+            name='verified_document_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='businessdocument',
+            index=models.Index(fields=['review_status'], name='document_review_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='businessdocument',
+            index=models.Index(fields=['business_profile', 'document_type', 'is_verified'], name='document_profile_type_idx'),
+        ),
+        migrations.RunPython(backfill_review_state, migrations.RunPython.noop),
+    ]
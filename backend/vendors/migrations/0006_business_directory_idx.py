@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0005_document_review'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='businessprofile',
+            index=models.Index(fields=['verification_status', 'business_type', '-created_at', '-id'], name='business_directory_idx'),
+        ),
+    ]
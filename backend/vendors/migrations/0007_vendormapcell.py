@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0006_business_directory_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorMapCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('x', models.PositiveIntegerField()),
+                ('y', models.PositiveIntegerField()),
+                ('business_type', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0)),
+                ('lng_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'business_type', 'x', 'y'), name='map_cell_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0008_webhook_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='businessprofile',
+            index=models.Index(fields=['verification_status', '-created_at', '-id'], name='business_status_directory_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='businessprofile',
+            name='business_status_created_idx',
+        ),
+    ]
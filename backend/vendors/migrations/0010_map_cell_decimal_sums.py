@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0009_directory_status_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vendormapcell',
+            name='lat_sum',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=24),
+        ),
+        migrations.AlterField(
+            model_name='vendormapcell',
+            name='lng_sum',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=24),
+        ),
+    ]
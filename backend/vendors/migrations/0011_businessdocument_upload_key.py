@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0010_map_cell_decimal_sums'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessdocument',
+            name='upload_key',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -1,7 +1,20 @@
 from django.db import models
+from django.utils import timezone
 from authenication.models import CustomUser
 
 class BusinessDocument(models.Model):
+    REVIEW_STATUS = [
+        ('pending', 'Pending'),
+        ('verified', 'Verified'),
+        ('rejected', 'Rejected'),
+    ]
+
+    VALIDATION_STATUS = [
+        ('pending', 'Pending'),
+        ('passed', 'Passed'),
+        ('failed', 'Failed'),
+    ]
+
     DOCUMENT_TYPES = [
         ('business_license', 'Business License'),
         ('tin_certificate', 'TIN Certificate'),
@@ -18,6 +31,32 @@ class BusinessDocument(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     is_verified = models.BooleanField(default=False)
 
+    # Staff review (see vendors.document_review); is_verified mirrors review_status == 'verified'
+    review_status = models.CharField(max_length=10, choices=REVIEW_STATUS, default='pending')
+    rejection_reason = models.TextField(blank=True)
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    reviewed_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_documents')
+
+    # Automated file checks (see vendors.document_validation)
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    detected_format = models.CharField(max_length=10, blank=True)
+    validation_status = models.CharField(max_length=10, choices=VALIDATION_STATUS, default='pending')
+    validation_notes = models.TextField(blank=True)
+    validated_at = models.DateTimeField(null=True, blank=True)
+
+    # Key of the signed URL a direct upload came through; unique, so each URL is used once (see vendors.direct_upload)
+    upload_key = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Admin changelist filters
+            models.Index(fields=['document_type'], name='document_type_idx'),
+            models.Index(fields=['review_status'], name='document_review_idx'),
+            models.Index(fields=['validation_status'], name='document_validation_idx'),
+            # Counting and required-type checks per business
+            models.Index(fields=['business_profile', 'document_type', 'is_verified'], name='document_profile_type_idx'),
+        ]
+
     def __str__(self):
         return f"{self.document_type} - {self.business_profile.business_name}"
 
@@ -62,26 +101,118 @@ class BusinessProfile(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True)
     verified_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_businesses')
     
+    # Reviewer queue lease (see vendors.review_queue)
+    review_claimed_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_businesses')
+    review_lease_expires_at = models.DateTimeField(null=True, blank=True)
+    
+    # Denormalized document counters, kept in sync by vendors.document_review
+    document_count = models.PositiveIntegerField(default=0)
+    verified_document_count = models.PositiveIntegerField(default=0)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='business_created_idx'),
+            # Status filters in the admin, and the public directory across types (keyset on created_at, id)
+            models.Index(fields=['verification_status', '-created_at', '-id'], name='business_status_directory_idx'),
+            models.Index(fields=['business_type', '-created_at'], name='business_type_created_idx'),
+            # Public directory keyset pagination within one type
+            models.Index(fields=['verification_status', 'business_type', '-created_at', '-id'], name='business_directory_idx'),
+            # Prefix search on business_name in the admin
+            models.Index(fields=['business_name'], name='business_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"{self.business_name} - {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember loaded values so save signals can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     @property
     def total_documents(self):
-        return self.documents.count()
+        return self.document_count
 
     @property
     def verified_documents(self):
-        return self.documents.filter(is_verified=True).count()
+        return self.verified_document_count
 
     @property
     def verification_progress(self):
         if self.total_documents == 0:
             return 0
         return (self.verified_documents / self.total_documents) * 100
+
+class VendorMapCell(models.Model):
+    """
+    Pre-aggregated approved businesses per map grid cell (see vendors.map_grid).
+
+    Cells use Web Mercator tile coordinates; business_type '' holds the total over all types.
+    """
+    zoom = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    business_type = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+    # Exact sums, so incremental updates never drift from a rebuild
+    lat_sum = models.DecimalField(max_digits=24, decimal_places=8, default=0)
+    lng_sum = models.DecimalField(max_digits=24, decimal_places=8, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'business_type', 'x', 'y'], name='map_cell_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.zoom}/{self.x}/{self.y} {self.business_type or 'all'}: {self.count}"
+
+class WebhookEndpoint(models.Model):
+    """Downstream system that receives signed business verification events"""
+    name = models.CharField(max_length=100)
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=128)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.url})"
+
+class WebhookEvent(models.Model):
+    """Outbox row, written in the same transaction as the change it describes"""
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
+
+class WebhookDelivery(models.Model):
+    STATUS = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+
+    event = models.ForeignKey(WebhookEvent, on_delete=models.CASCADE, related_name='deliveries')
+    endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='deliveries')
+    status = models.CharField(max_length=10, choices=STATUS, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Dispatcher polls for due pending deliveries
+            models.Index(fields=['next_attempt_at'], name='webhook_due_idx', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.event} -> {self.endpoint.name} ({self.status})"
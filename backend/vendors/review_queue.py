@@ -0,0 +1,86 @@
+"""
+Work queue for staff reviewing businesses.
+
+Each reviewer claims a batch of `under_review` businesses with a time-limited
+lease, so concurrent reviewers never get the same business. On PostgreSQL the
+claim uses SELECT ... FOR UPDATE SKIP LOCKED, so reviewers claiming at the same
+time skip each other's rows instead of waiting on them. Other databases fall
+back to a conditional UPDATE that only takes rows whose lease is still free.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import BusinessProfile
+
+
+def _lease_expiry(now):
+    return now + timezone.timedelta(minutes=settings.REVIEW_LEASE_MINUTES)
+
+
+def _unclaimed(now):
+    return BusinessProfile.objects.filter(
+        Q(review_lease_expires_at__isnull=True) | Q(review_lease_expires_at__lte=now),
+        verification_status='under_review',
+    ).order_by('created_at')
+
+
+def claim_businesses(reviewer, count):
+    """Lease up to `count` unclaimed businesses to `reviewer`, oldest first"""
+    now = timezone.now()
+    lease_expires_at = _lease_expiry(now)
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(
+                _unclaimed(now).select_for_update(skip_locked=True).values_list('id', flat=True)[:count]
+            )
+            BusinessProfile.objects.filter(id__in=ids).update(
+                review_claimed_by=reviewer, review_lease_expires_at=lease_expires_at
+            )
+        else:
+            candidates = list(_unclaimed(now).values_list('id', flat=True)[:count])
+            # Re-check the lease in the UPDATE; rows taken by someone else in between are skipped
+            _unclaimed(now).filter(id__in=candidates).update(
+                review_claimed_by=reviewer, review_lease_expires_at=lease_expires_at
+            )
+            claimed = set(
+                BusinessProfile.objects.filter(
+                    id__in=candidates, review_claimed_by=reviewer, review_lease_expires_at=lease_expires_at
+                ).values_list('id', flat=True)
+            )
+            ids = [business_id for business_id in candidates if business_id in claimed]
+
+    return ids, lease_expires_at
+
+
+def _held_by(reviewer, business_ids, now):
+    return BusinessProfile.objects.filter(
+        id__in=business_ids, review_claimed_by=reviewer, review_lease_expires_at__gt=now
+    )
+
+
+def renew_leases(reviewer, business_ids):
+    """Extend the reviewer's unexpired leases; returns the ids that were renewed"""
+    now = timezone.now()
+    lease_expires_at = _lease_expiry(now)
+    with transaction.atomic():
+        ids = list(_held_by(reviewer, business_ids, now).values_list('id', flat=True))
+        BusinessProfile.objects.filter(id__in=ids).update(review_lease_expires_at=lease_expires_at)
+    return ids, lease_expires_at
+
+
+def release_leases(reviewer, business_ids):
+    """Give the reviewer's leases back to the queue; returns the number released"""
+    return _held_by(reviewer, business_ids, timezone.now()).update(
+        review_claimed_by=None, review_lease_expires_at=None
+    )
+
+
+def is_leased_to_other(business_profile, reviewer):
+    """True if another reviewer holds an unexpired lease on this business"""
+    return (
+        business_profile.review_lease_expires_at is not None
+        and business_profile.review_lease_expires_at > timezone.now()
+        and business_profile.review_claimed_by_id not in (None, reviewer.id)
+    )
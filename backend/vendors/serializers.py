@@ -1,12 +1,19 @@
 from rest_framework import serializers
 from .models import BusinessProfile, BusinessDocument
+from .document_validation import SNIFF_LENGTH, get_upload_limits, sniff_format
 from authenication.models import CustomUser
 
 class BusinessDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = BusinessDocument
-        fields = ['id', 'document_type', 'document_file', 'document_name', 'uploaded_at', 'is_verified']
-        read_only_fields = ['id', 'uploaded_at', 'is_verified']
+        fields = [
+            'id', 'document_type', 'document_file', 'document_name', 'uploaded_at', 'is_verified',
+            'review_status', 'rejection_reason', 'validation_status', 'validation_notes'
+        ]
+        read_only_fields = [
+            'id', 'uploaded_at', 'is_verified', 'review_status', 'rejection_reason',
+            'validation_status', 'validation_notes'
+        ]
 
 class BusinessRegistrationSerializer(serializers.ModelSerializer):
     documents = BusinessDocumentSerializer(many=True, read_only=True)
@@ -73,7 +80,43 @@ class DocumentUploadSerializer(serializers.ModelSerializer):
         model = BusinessDocument
         fields = ['document_type', 'document_file', 'document_name']
 
+    def validate(self, attrs):
+        document_file = attrs['document_file']
+        limits = get_upload_limits(attrs['document_type'])
+
+        if document_file.size > limits['max_size']:
+            raise serializers.ValidationError({
+                'document_file': f"File is larger than {limits['max_size'] // (1024 * 1024)} MB."
+            })
+
+        document_file.seek(0)
+        file_format = sniff_format(document_file.read(SNIFF_LENGTH))
+        document_file.seek(0)
+        if file_format not in limits['formats']:
+            raise serializers.ValidationError({
+                'document_file': f"Unsupported file format. Allowed: {', '.join(limits['formats'])}."
+            })
+
+        attrs['file_size'] = document_file.size
+        attrs['detected_format'] = file_format
+        return attrs
+
     def create(self, validated_data):
         business_profile = self.context['business_profile']
         validated_data['business_profile'] = business_profile
         return super().create(validated_data)
+
+class DirectUploadSerializer(serializers.Serializer):
+    document_type = serializers.ChoiceField(choices=BusinessDocument.DOCUMENT_TYPES)
+    document_name = serializers.CharField(max_length=255)
+
+class PublicBusinessSerializer(serializers.ModelSerializer):
+    """Public projection of an approved business; never exposes TIN or license numbers"""
+    class Meta:
+        model = BusinessProfile
+        fields = [
+            'id', 'business_name', 'business_type', 'business_description',
+            'business_address', 'business_phone', 'business_email',
+            'location_lat', 'location_lng', 'created_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .directory import invalidate_directory_cache
+from .map_grid import map_state, sync_business
+from .models import BusinessProfile
+
+MAP_FIELDS = ['verification_status', 'location_lat', 'location_lng', 'business_type']
+
+
+def _was_approved(instance):
+    return getattr(instance, '_loaded_values', {}).get('verification_status') == 'approved'
+
+
+def _current_state(instance):
+    return map_state(*(getattr(instance, field) for field in MAP_FIELDS))
+
+
+@receiver(pre_save, sender=BusinessProfile)
+def business_profile_saving(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._map_old_state = None
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if not all(field in loaded for field in MAP_FIELDS):
+        # Loaded with deferred fields, read what is stored before it is overwritten
+        loaded = BusinessProfile.objects.filter(pk=instance.pk).values(*MAP_FIELDS).first() or {}
+    instance._map_old_state = map_state(*(loaded.get(field) for field in MAP_FIELDS))
+
+
+@receiver(post_save, sender=BusinessProfile)
+def business_profile_saved(sender, instance, created, **kwargs):
+    sync_business(getattr(instance, '_map_old_state', None), _current_state(instance))
+
+    # Only approved businesses are listed, so other saves cannot change a page
+    if instance.verification_status == 'approved' or _was_approved(instance):
+        invalidate_directory_cache()
+
+    # The saved values are what a later save of this instance changes from
+    instance._loaded_values = {
+        field.attname: getattr(instance, field.attname)
+        for field in sender._meta.concrete_fields
+        if field.attname in instance.__dict__
+    }
+
+
+@receiver(post_delete, sender=BusinessProfile)
+def business_profile_deleted(sender, instance, **kwargs):
+    sync_business(_current_state(instance), None)
+    if instance.verification_status == 'approved':
+        invalidate_directory_cache()
@@ -1,3 +1,703 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+from authenication.models import CustomUser
+from core.testing import isolated_caches
+from . import document_validation
+from .admin import BusinessProfileAdmin
+from .direct_upload import DirectUploadApp, create_upload_token
+from .directory import VERSION_KEY
+from .document_review import review_documents
+from .document_validation import DocumentUploadHandler, _check_pdf, _pdf_page_count, get_upload_limits, sniff_format
+from .map_grid import cell_coordinates, cell_zooms
+from .models import (
+    BusinessDocument, BusinessProfile, VendorMapCell, WebhookDelivery, WebhookEndpoint, WebhookEvent,
+)
+from .review_queue import claim_businesses, is_leased_to_other, release_leases, renew_leases
+from .webhooks import dispatch_pending, record_status_events_for, sign
+
+
+class StubReceiver(BaseHTTPRequestHandler):
+    """Records every POST on the server and answers with server.status_code"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(self.server.status_code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def make_business(n, status='pending'):
+    user = CustomUser.objects.create(username=f'vendor{n}', email=f'vendor{n}@example.com', phone=f'+25191000{n:04d}')
+    return BusinessProfile.objects.create(
+        user=user, business_name=f'Vendor {n}', business_type='grocery', tin_number=f'TIN{n:04d}',
+        business_license_number='L', business_phone='0911000000', business_email=user.email,
+        verification_status=status,
+    )
+
+
+@override_settings(WEBHOOK_BATCH_SIZE=2, WEBHOOK_MAX_CONCURRENCY=2, WEBHOOK_TIMEOUT_SECONDS=2)
+class WebhookDispatchTests(TestCase):
+    """Runs the dispatcher against a stub receiver on localhost"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubReceiver)
+        self.server.received = []
+        self.server.status_code = 204
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.endpoint = WebhookEndpoint.objects.create(
+            name='stub', url=f'http://127.0.0.1:{self.server.server_port}/hooks', secret='s3cret'
+        )
+
+    def test_delivers_signed_batches(self):
+        businesses = [make_business(n, 'approved') for n in range(3)]
+        record_status_events_for([business.id for business in businesses])
+
+        self.assertEqual(dispatch_pending(), (3, 0))
+
+        self.assertEqual(len(self.server.received), 2)
+        events = []
+        for headers, body in self.server.received:
+            timestamp = headers['X-ODA-Timestamp']
+            self.assertEqual(headers['X-ODA-Signature'], f"sha256={sign('s3cret', timestamp, body)}")
+            events += json.loads(body)['events']
+        self.assertEqual(sorted(event['data']['business_id'] for event in events), [b.id for b in businesses])
+        self.assertFalse(WebhookDelivery.objects.exclude(status='delivered').exists())
+
+    def test_failed_batch_is_retried_later(self):
+        self.server.status_code = 500
+        record_status_events_for([make_business(1, 'rejected').id])
+
+        self.assertEqual(dispatch_pending(), (0, 1))
+
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual((delivery.status, delivery.attempts, delivery.last_error), ('pending', 1, 'HTTP 500'))
+        self.assertGreater(delivery.next_attempt_at, timezone.now())
+
+    def test_bad_endpoint_url_does_not_stop_other_endpoints(self):
+        WebhookEndpoint.objects.create(name='broken', url='http://127.0.0.1:99999/hooks', secret='x')
+        WebhookEndpoint.objects.create(name='not http', url='ftp://example.com/hooks', secret='x')
+        record_status_events_for([make_business(1, 'approved').id])
+
+        self.assertEqual(dispatch_pending(), (1, 2))
+
+        self.assertEqual(len(self.server.received), 1)
+        broken = WebhookDelivery.objects.exclude(endpoint=self.endpoint)
+        self.assertEqual(sorted(broken.values_list('status', 'attempts')), [('pending', 1), ('pending', 1)])
+        self.assertTrue(all(broken.values_list('last_error', flat=True)))
+
+
+class BusinessAdminEventTests(TestCase):
+    def setUp(self):
+        self.model_admin = BusinessProfileAdmin(BusinessProfile, admin.site)
+        self.request = RequestFactory().post('/')
+        self.request.user = CustomUser.objects.create(username='staff', phone='+251900000000', is_staff=True)
+
+    def test_only_changed_businesses_get_events(self):
+        approved = make_business(1, 'approved')
+        verified_at = timezone.now() - timezone.timedelta(days=3)
+        BusinessProfile.objects.filter(id=approved.id).update(verified_at=verified_at)
+        pending = make_business(2)
+        rejected = make_business(3, 'rejected')
+        queryset = BusinessProfile.objects.filter(id__in=[approved.id, pending.id, rejected.id])
+
+        with mock.patch.object(self.model_admin, 'message_user'):
+            self.model_admin.approve_selected(self.request, queryset)
+            self.assertEqual(
+                sorted(e.payload['business_id'] for e in WebhookEvent.objects.all()), [pending.id, rejected.id]
+            )
+            # The business that was already approved keeps its approval
+            approved.refresh_from_db()
+            self.assertEqual((approved.verified_at, approved.verified_by), (verified_at, None))
+            WebhookEvent.objects.all().delete()
+            still_rejected = make_business(4, 'rejected')
+            self.model_admin.reject_selected(
+                self.request, BusinessProfile.objects.filter(id__in=[approved.id, still_rejected.id])
+            )
+
+        self.assertEqual([e.payload['business_id'] for e in WebhookEvent.objects.all()], [approved.id])
+
+
+def make_pdf(pages):
+    return (
+        b'%PDF-1.4\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n'
+        b'2 0 obj\n<< /Type /Pages /Kids [] /Count ' + str(pages).encode() + b' >>\nendobj\n%%EOF\n'
+    )
+
+
+class DocumentCheckTests(SimpleTestCase):
+    def test_sniff_format(self):
+        self.assertEqual(sniff_format(b'%PDF-1.7\n'), 'pdf')
+        self.assertEqual(sniff_format(b'\x89PNG\r\n\x1a\n\x00\x00'), 'png')
+        self.assertEqual(sniff_format(b'\xff\xd8\xff\xe0'), 'jpeg')
+        self.assertIsNone(sniff_format(b'GIF89a'))
+        self.assertIsNone(sniff_format(b''))
+
+    def test_pdf_page_count(self):
+        self.assertEqual(_pdf_page_count(make_pdf(3)), 3)
+        self.assertIsNone(_pdf_page_count(b'%PDF-1.4\n%%EOF'))
+
+    def test_pdf_page_count_in_object_stream(self):
+        packed = zlib.compress(b'2 0 << /Type /Pages /Kids [] /Count 7 >>')
+        data = (
+            b'%PDF-1.5\n5 0 obj\n<< /Type /ObjStm /N 1 /First 4 /Filter /FlateDecode /Length '
+            + str(len(packed)).encode() + b' >>\nstream\n' + packed + b'\nendstream\nendobj\n%%EOF\n'
+        )
+        self.assertEqual(_pdf_page_count(data), 7)
+
+    def test_pdf_scan_is_linear_on_unterminated_objects(self):
+        for data in [b'1 0 obj ' * 128 * 1024, b' obj' * 256 * 1024, (b'9' * 1000 + b' 0 obj') * 1000]:
+            started = time.monotonic()
+            self.assertIsNone(_pdf_page_count(data))
+            self.assertLess(time.monotonic() - started, 2)
+
+    def test_page_limits_per_document_type(self):
+        data = make_pdf(3)
+        self.assertEqual(_check_pdf(data, get_upload_limits('business_license')), ([], {'pages': 3}))
+        errors, _ = _check_pdf(data, get_upload_limits('tin_certificate'))
+        self.assertEqual(errors, ['PDF has 3 pages, the limit is 2.'])
+
+
+@isolated_caches
+@override_settings(DOCUMENT_UPLOAD_LIMITS={
+    'default': {
+        'max_size': 2048, 'formats': ['pdf', 'png'], 'max_pages': 20,
+        'min_image_side': 300, 'max_image_pixels': 50_000_000,
+    },
+    'tin_certificate': {'max_size': 1024, 'formats': ['pdf']},
+})
+class DocumentUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.business = make_business(1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.business.user)
+
+    def upload(self, content, document_type='business_license'):
+        return self.client.post('/api/vendors/business/upload-documents/', {
+            'document_type': document_type,
+            'document_name': 'license',
+            'document_file': SimpleUploadedFile('license.pdf', content),
+        })
+
+    def test_accepts_a_valid_document(self):
+        response = self.upload(make_pdf(1))
+        self.assertEqual(response.status_code, 201)
+        document = BusinessDocument.objects.get()
+        self.assertEqual((document.detected_format, document.file_size), ('pdf', len(make_pdf(1))))
+
+    def test_unsupported_format_is_dropped_while_streaming(self):
+        response = self.upload(b'GIF89a' + b'\x00' * 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'document_file': ['Unsupported file format. Upload a PDF, PNG or JPEG file.']})
+        self.assertFalse(BusinessDocument.objects.exists())
+
+    def test_file_over_every_limit_is_dropped_while_streaming(self):
+        with mock.patch('vendors.document_validation.DocumentUploadHandler._reject', autospec=True,
+                        side_effect=DocumentUploadHandler._reject) as reject:
+            response = self.upload(make_pdf(1) + b' ' * 4096)
+        self.assertEqual(response.status_code, 400)
+        reject.assert_called_once()
+        self.assertFalse(BusinessDocument.objects.exists())
+
+    def test_limits_of_the_document_type_apply(self):
+        content = make_pdf(1) + b' ' * 1200
+        self.assertEqual(self.upload(content, 'tin_certificate').status_code, 400)
+        self.assertEqual(self.upload(content, 'business_license').status_code, 201)
+        png = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+        self.assertEqual(self.upload(png, 'tin_certificate').status_code, 400)
+        self.assertEqual(BusinessDocument.objects.count(), 1)
+
+
+@skipUnless(hasattr(os, 'mkfifo'), 'needs named pipes')
+@override_settings(DOCUMENT_VALIDATION_TIMEOUT=2)
+class DocumentValidationTimeoutTests(TransactionTestCase):
+    """A check that never finishes: its worker is killed and the pool replaced"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.addCleanup(lambda: document_validation._executor and document_validation._reset_executor(
+            document_validation._executor, terminate=True
+        ))
+        self.business = make_business(1)
+
+    def document(self, name):
+        path = os.path.join(self.directory, name)
+        os.mkfifo(path)
+        document = BusinessDocument.objects.create(
+            business_profile=self.business, document_type='other', document_file=name, document_name=name,
+        )
+        return document, path
+
+    def wait_for_result(self, document):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            document.refresh_from_db()
+            if document.validation_status != 'pending':
+                return document
+            time.sleep(0.05)
+        self.fail('Validation result was never recorded')
+
+    def test_stuck_check_is_killed_and_others_are_retried(self):
+        limits = get_upload_limits('other')
+        stuck, stuck_path = self.document('stuck.pdf')
+        bystander, bystander_path = self.document('bystander.pdf')
+
+        document_validation._submit_validation(stuck.id, stuck_path, 'pdf', limits)
+        executor = document_validation._executor
+        time.sleep(1)
+        document_validation._submit_validation(bystander.id, bystander_path, 'pdf', limits)
+        workers = list(executor._processes.values())
+
+        self.assertEqual(self.wait_for_result(stuck).validation_notes, 'Validation timed out.')
+        for worker in workers:
+            worker.join(5)
+            self.assertFalse(worker.is_alive())
+
+        # The bystander was killed with the pool and now waits in a fresh one
+        self.assertIsNot(document_validation._executor, executor)
+        with open(bystander_path, 'wb') as f:
+            f.write(make_pdf(2))
+        bystander = self.wait_for_result(bystander)
+        self.assertEqual((bystander.validation_status, bystander.validation_notes), ('passed', 'pages: 2'))
+
+
+class ReviewQueueTests(TestCase):
+    def setUp(self):
+        self.businesses = [make_business(n, 'under_review') for n in range(4)]
+        self.alice = CustomUser.objects.create(username='alice', phone='+251900000001', is_staff=True)
+        self.bob = CustomUser.objects.create(username='bob', phone='+251900000002', is_staff=True)
+
+    def test_reviewers_get_disjoint_batches_oldest_first(self):
+        alice_ids, _ = claim_businesses(self.alice, 3)
+        bob_ids, _ = claim_businesses(self.bob, 3)
+
+        self.assertEqual(alice_ids, [b.id for b in self.businesses[:3]])
+        self.assertEqual(bob_ids, [self.businesses[3].id])
+        self.assertEqual(claim_businesses(self.bob, 3)[0], [])
+
+    def test_expired_lease_returns_to_the_queue(self):
+        alice_ids, _ = claim_businesses(self.alice, 4)
+        BusinessProfile.objects.filter(id=alice_ids[0]).update(
+            review_lease_expires_at=timezone.now() - timezone.timedelta(seconds=1)
+        )
+
+        self.assertEqual(claim_businesses(self.bob, 4)[0], [alice_ids[0]])
+        # Alice can no longer renew it, but keeps the others
+        renewed, _ = renew_leases(self.alice, alice_ids)
+        self.assertEqual(sorted(renewed), sorted(alice_ids[1:]))
+        business = BusinessProfile.objects.get(id=alice_ids[0])
+        self.assertTrue(is_leased_to_other(business, self.alice))
+        self.assertFalse(is_leased_to_other(business, self.bob))
+
+    def test_release_only_gives_back_own_leases(self):
+        alice_ids, _ = claim_businesses(self.alice, 2)
+        bob_ids, _ = claim_businesses(self.bob, 2)
+
+        self.assertEqual(release_leases(self.alice, alice_ids + bob_ids), 2)
+        self.assertEqual(claim_businesses(self.bob, 4)[0], alice_ids)
+
+    def test_claim_endpoint_is_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(self.businesses[0].user)
+        self.assertEqual(client.post('/api/vendors/admin/review-queue/claim/', {'count': 2}).status_code, 403)
+
+        client.force_authenticate(self.alice)
+        response = client.post('/api/vendors/admin/review-queue/claim/', {'count': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b['id'] for b in response.data['businesses']], [b.id for b in self.businesses[:2]])
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ReviewQueueSkipLockedTests(TransactionTestCase):
+    def test_claim_skips_rows_locked_by_a_concurrent_claim(self):
+        businesses = [make_business(n, 'under_review') for n in range(3)]
+        alice = CustomUser.objects.create(username='alice', phone='+251900000001', is_staff=True)
+        locked = threading.Event()
+        done = threading.Event()
+
+        def hold_lock():
+            with transaction.atomic():
+                list(BusinessProfile.objects.filter(id=businesses[0].id).select_for_update())
+                locked.set()
+                done.wait(10)
+            connections.close_all()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            locked.wait(10)
+            started = time.monotonic()
+            ids, _ = claim_businesses(alice, 2)
+            # No waiting on the locked row, the next ones are taken instead
+            self.assertLess(time.monotonic() - started, 5)
+            self.assertEqual(ids, [businesses[1].id, businesses[2].id])
+        finally:
+            done.set()
+            thread.join()
+
+
+def make_document(business, document_type):
+    return BusinessDocument.objects.create(
+        business_profile=business, document_type=document_type,
+        document_file=f'business_documents/{document_type}.pdf', document_name=document_type,
+    )
+
+
+@isolated_caches
+class BulkDocumentReviewTests(TestCase):
+    def setUp(self):
+        self.complete = make_business(1, 'under_review')
+        self.partial = make_business(2, 'under_review')
+        self.documents = [
+            make_document(self.complete, 'business_license'),
+            make_document(self.complete, 'tin_certificate'),
+            make_document(self.partial, 'business_license'),
+        ]
+        self.staff = CustomUser.objects.create(username='staff', phone='+251900000000', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def review(self, **data):
+        data.setdefault('document_ids', [d.id for d in self.documents])
+        return self.client.post('/api/vendors/admin/documents/review/', data, format='json')
+
+    def test_verify_with_auto_approve_advances_complete_businesses(self):
+        response = self.review(decision='verified', auto_approve=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['approved_businesses']), (3, [self.complete.id]))
+        self.complete.refresh_from_db()
+        self.partial.refresh_from_db()
+        self.assertEqual((self.complete.verification_status, self.complete.verified_by), ('approved', self.staff))
+        self.assertEqual((self.complete.document_count, self.complete.verified_document_count), (2, 2))
+        self.assertEqual((self.partial.verification_status, self.partial.verified_document_count), ('under_review', 1))
+        self.assertEqual([e.payload['business_id'] for e in WebhookEvent.objects.all()], [self.complete.id])
+
+    def test_verify_without_auto_approve_only_marks_documents(self):
+        response = self.review(decision='verified')
+
+        self.assertEqual(response.data['approved_businesses'], [])
+        self.assertEqual(BusinessDocument.objects.filter(is_verified=True, reviewed_by=self.staff).count(), 3)
+        self.assertFalse(BusinessProfile.objects.filter(verification_status='approved').exists())
+
+    def test_reject_needs_a_reason_and_clears_verification(self):
+        self.review(decision='verified')
+        self.assertEqual(self.review(decision='rejected').status_code, 400)
+
+        response = self.review(decision='rejected', reason='Blurry scan', auto_approve=True)
+
+        self.assertEqual((response.data['updated'], response.data['approved_businesses']), (3, []))
+        self.assertEqual(
+            set(BusinessDocument.objects.values_list('review_status', 'is_verified', 'rejection_reason')),
+            {('rejected', False, 'Blurry scan')},
+        )
+        self.complete.refresh_from_db()
+        self.assertEqual(self.complete.verified_document_count, 0)
+
+    @override_settings(DOCUMENT_REVIEW_MAX_BATCH=2)
+    def test_batch_size_and_ids_are_validated(self):
+        self.assertEqual(self.review(decision='verified').status_code, 400)
+        self.assertEqual(self.review(decision='verified', document_ids=['1']).status_code, 400)
+        self.assertEqual(self.review(decision='maybe', document_ids=[self.documents[0].id]).status_code, 400)
+        self.assertFalse(BusinessDocument.objects.exclude(review_status='pending').exists())
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.complete.user)
+        self.assertEqual(self.review(decision='verified').status_code, 403)
+
+
+@isolated_caches
+class BusinessDirectoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.businesses = [make_business(n, 'approved') for n in range(5)]
+        make_business(5, 'pending')
+        # Two businesses created in the same instant, only the id breaks the tie
+        now = timezone.now()
+        for business, age in zip(self.businesses, [4, 3, 2, 2, 1]):
+            BusinessProfile.objects.filter(id=business.id).update(created_at=now - timezone.timedelta(hours=age))
+
+    def page(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get('/api/vendors/directory/', {'page_size': 2, **params})
+
+    def all_pages(self):
+        ids, cursor = [], None
+        while True:
+            data = self.page(cursor).data
+            ids.append([business['id'] for business in data['results']])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_the_keyset_newest_first(self):
+        b = [business.id for business in self.businesses]
+        self.assertEqual(self.all_pages(), [[b[4], b[3]], [b[2], b[1]], [b[0]]])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.page('not-a-cursor').status_code, 400)
+        self.assertEqual(self.page(page_size=0).status_code, 400)
+        self.assertEqual(self.page(business_type='spaceship').status_code, 400)
+
+    def test_pages_are_cached_until_a_listed_business_changes_after_commit(self):
+        first = self.page().data
+
+        business = self.businesses[4]
+        business.business_name = 'Renamed'
+        business.save()
+        # Not committed yet: the cached page is still served
+        self.assertEqual(self.page().data, first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            business.save()
+        self.assertEqual(self.page().data['results'][0]['business_name'], 'Renamed')
+
+    def test_unlisted_business_changes_keep_the_cache(self):
+        self.page()
+        version = caches[settings.DIRECTORY_CACHE].get(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            pending = BusinessProfile.objects.get(verification_status='pending')
+            pending.business_name = 'Renamed'
+            pending.save()
+        self.assertEqual(caches[settings.DIRECTORY_CACHE].get(VERSION_KEY), version)
+
+    def test_approving_through_the_api_lists_the_business(self):
+        pending = BusinessProfile.objects.get(verification_status='pending')
+        staff = CustomUser.objects.create(username='staff', phone='+251900000000', is_staff=True)
+        self.page()
+
+        client = APIClient()
+        client.force_authenticate(staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/api/vendors/admin/business/{pending.id}/verify/', {'verification_status': 'approved'})
+
+        self.assertEqual(self.page().data['results'][0]['id'], pending.id)
+
+
+class MapGridTests(TestCase):
+    """Incremental cell updates must always match a rebuild from scratch"""
+
+    def setUp(self):
+        self.staff = CustomUser.objects.create(username='staff', phone='+251900000000', is_staff=True)
+        self.model_admin = BusinessProfileAdmin(BusinessProfile, admin.site)
+        self.request = RequestFactory().post('/')
+        self.request.user = self.staff
+        self.businesses = []
+        for n, (lat, lng) in enumerate([('9.01000001', '38.76000001'), ('9.01000002', '38.76000002'), ('-1.28', '36.82')]):
+            business = make_business(n)
+            business.location_lat, business.location_lng = Decimal(lat), Decimal(lng)
+            business.save()
+            self.businesses.append(business)
+
+    def cells(self):
+        return set(
+            VendorMapCell.objects.filter(count__gt=0)
+            .values_list('zoom', 'x', 'y', 'business_type', 'count', 'lat_sum', 'lng_sum')
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.cells()
+        call_command('rebuild_map_grid', stdout=StringIO())
+        self.assertEqual(incremental, self.cells())
+
+    def test_nothing_is_counted_before_approval(self):
+        self.assertEqual(self.cells(), set())
+        self.assertMatchesRebuild()
+
+    def test_approve_move_and_reject(self):
+        first, second, third = self.businesses
+        for business in (first, second):
+            business.verification_status = 'approved'
+            business.save()
+        self.assertEqual(VendorMapCell.objects.get(zoom=3, business_type='').count, 2)
+        self.assertMatchesRebuild()
+
+        first.location_lat = Decimal('9.5')
+        first.business_type = 'pharmacy'
+        first.save()
+        self.assertMatchesRebuild()
+
+        second.verification_status = 'rejected'
+        second.save()
+        self.assertMatchesRebuild()
+
+        with mock.patch.object(self.model_admin, 'message_user'):
+            self.model_admin.approve_selected(self.request, BusinessProfile.objects.all())
+            self.assertMatchesRebuild()
+            self.model_admin.reject_selected(self.request, BusinessProfile.objects.filter(id=third.id))
+        self.assertMatchesRebuild()
+
+    def test_delete_removes_the_business(self):
+        business = self.businesses[0]
+        business.verification_status = 'approved'
+        business.save()
+        business.delete()
+
+        self.assertEqual(self.cells(), set())
+        self.assertMatchesRebuild()
+
+    def test_auto_approval_counts_the_business(self):
+        business = self.businesses[2]
+        documents = [make_document(business, t) for t in ('business_license', 'tin_certificate')]
+        review_documents(self.staff, [d.id for d in documents], 'verified', auto_approve=True)
+
+        self.assertEqual(VendorMapCell.objects.filter(count=1).count(), 2 * len(cell_zooms()))
+        self.assertMatchesRebuild()
+
+    def test_tile_clusters_nearby_businesses(self):
+        for business in self.businesses[:2]:
+            business.verification_status = 'approved'
+            business.save()
+        x, y = cell_coordinates(Decimal('9.01'), Decimal('38.76'), 10)
+
+        response = APIClient().get(f'/api/vendors/map/tiles/10/{x}/{y}/')
+
+        self.assertEqual(response.status_code, 200)
+        [cell] = response.data['cells']
+        self.assertEqual(cell['count'], 2)
+        self.assertAlmostEqual(cell['lat'], 9.010000015)
+
+
+class VerificationStatusEventTests(TestCase):
+    def setUp(self):
+        self.business = make_business(1, 'under_review')
+        self.client = APIClient()
+        self.client.force_authenticate(
+            CustomUser.objects.create(username='staff', phone='+251900000000', is_staff=True)
+        )
+
+    def verify(self, new_status, notes=''):
+        return self.client.post(
+            f'/api/vendors/admin/business/{self.business.id}/verify/',
+            {'verification_status': new_status, 'verification_notes': notes},
+        )
+
+    def test_event_only_when_the_status_changes(self):
+        self.assertEqual(self.verify('approved').status_code, 200)
+        self.assertEqual(self.verify('approved', 'Checked twice').status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+        self.verify('rejected', 'License expired')
+        self.assertEqual(
+            [event.payload['verification_status'] for event in WebhookEvent.objects.order_by('id')],
+            ['approved', 'rejected'],
+        )
+
+
+@override_settings(DOCUMENT_UPLOAD_LIMITS={
+    'default': {
+        'max_size': 2048, 'formats': ['pdf'], 'max_pages': 20,
+        'min_image_side': 300, 'max_image_pixels': 50_000_000,
+    },
+})
+class DirectUploadTests(TransactionTestCase):
+    """Drives the ASGI upload app directly; its database work runs in other threads"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        self.enterContext(mock.patch('vendors.document_review.run_deep_validation'))
+        self.business = make_business(1, 'under_review')
+        self.token = create_upload_token(self.business, 'business_license', 'License')
+
+    def put(self, chunks, content_length=None, token=None):
+        headers = [(b'content-type', b'application/pdf')]
+        if content_length is not None:
+            headers.append((b'content-length', str(content_length).encode()))
+        scope = {
+            'type': 'http', 'method': 'PUT', 'headers': headers,
+            'path': f'{settings.DIRECT_UPLOAD_PATH}{token or self.token}',
+        }
+        messages = [
+            {'type': 'http.request', 'body': chunk, 'more_body': n < len(chunks) - 1}
+            for n, chunk in enumerate(chunks)
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(DirectUploadApp()(scope, receive, send))
+        return sent[0]['status'], json.loads(sent[1]['body']), len(messages)
+
+    def stored_files(self):
+        directory = os.path.join(self.media, 'business_documents')
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def test_upload_creates_the_document_once(self):
+        content = make_pdf(1)
+        status, data, _ = self.put([content[:10], content[10:]], len(content))
+
+        self.assertEqual(status, 201)
+        document = BusinessDocument.objects.get(id=data['document_id'])
+        self.assertEqual((document.file_size, document.detected_format), (len(content), 'pdf'))
+        self.assertEqual(self.put([content])[:2], (409, {'error': 'Upload URL has already been used'}))
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_concurrent_use_of_the_url_is_caught_by_the_unique_key(self):
+        # Both uploads passed the early check; the second one loses when its row is saved
+        self.put([make_pdf(1)])
+        with mock.patch('vendors.direct_upload.upload_url_used', return_value=False):
+            status, _, _ = self.put([make_pdf(1)])
+
+        self.assertEqual(status, 409)
+        self.assertEqual(BusinessDocument.objects.count(), 1)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_content_length_is_checked_before_reading_the_body(self):
+        body = [make_pdf(1)]
+        self.assertEqual(self.put(body, 'ten')[:2], (400, {'error': 'Invalid Content-Length header'}))
+        self.assertEqual(self.put(body, -1)[0], 400)
+        status, _, unread = self.put(body, 4096)
+        self.assertEqual((status, unread), (413, 1))
+        self.assertFalse(BusinessDocument.objects.exists())
+
+    def test_body_over_the_limit_without_content_length(self):
+        status, _, unread = self.put([make_pdf(1), b' ' * 1500, b' ' * 1500, b' ' * 1500])
+        self.assertEqual((status, unread), (413, 1))
+        self.assertFalse(BusinessDocument.objects.exists())
+
+    def test_format_and_token_are_checked(self):
+        self.assertEqual(self.put([b'\x89PNG\r\n\x1a\n' + b'\x00' * 100])[0], 415)
+        self.assertEqual(self.put([make_pdf(1)], token='forged')[0], 403)
+        self.assertFalse(BusinessDocument.objects.exists())
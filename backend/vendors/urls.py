@@ -5,9 +5,19 @@ urlpatterns = [
     # Business registration endpoints
     path('business/register/', views.register_business, name='register_business'),
     path('business/upload-documents/', views.upload_business_documents, name='upload_business_documents'),
+    path('business/upload-url/', views.create_document_upload_url, name='create_document_upload_url'),
     path('business/verification-status/', views.get_verification_status, name='business_verification_status'),
     
+    # Public endpoints
+    path('directory/', views.business_directory, name='business_directory'),
+    path('map/tiles/<int:zoom>/<int:x>/<int:y>/', views.vendor_map_tile, name='vendor_map_tile'),
+    
     # Admin endpoints for managing business verification
     path('admin/pending-businesses/', views.list_pending_businesses, name='list_pending_businesses'),
     path('admin/business/<int:business_id>/verify/', views.update_verification_status, name='update_verification_status'),
+    path('admin/documents/<int:document_id>/review/', views.review_document, name='review_document'),
+    path('admin/documents/review/', views.bulk_review_documents, name='bulk_review_documents'),
+    path('admin/review-queue/claim/', views.claim_review_batch, name='claim_review_batch'),
+    path('admin/review-queue/renew/', views.renew_review_leases, name='renew_review_leases'),
+    path('admin/review-queue/release/', views.release_review_leases, name='release_review_leases'),
 ]
@@ -1,17 +1,32 @@
 from rest_framework import status, permissions
-from rest_framework.decorators import api_view, permission_classes, parser_classes
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, parser_classes
+from rest_framework.parsers import FormParser
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from core.idempotency import idempotent
 from .models import BusinessProfile, BusinessDocument
+from .caching import business_profile_cache
+from .document_validation import DocumentUploadParser, get_upload_errors, get_upload_limits
+from .review_queue import claim_businesses, renew_leases, release_leases, is_leased_to_other
+from .document_review import DECISIONS, document_stored, review_documents
+from .direct_upload import create_upload_token, direct_uploads_enabled, upload_url
+from .directory import decode_cursor, directory_page, encode_cursor, page_cache_key
+from .map_grid import tile_cells
+from .webhooks import record_status_events
 from .serializers import (
     BusinessRegistrationSerializer,
     BusinessProfileSerializer,
-    DocumentUploadSerializer
+    DirectUploadSerializer,
+    DocumentUploadSerializer,
+    PublicBusinessSerializer
 )
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent
 def register_business(request):
     """Register a new business for the authenticated vendor"""
     
@@ -36,7 +51,8 @@ def register_business(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-@parser_classes([MultiPartParser, FormParser])
+@parser_classes([DocumentUploadParser, FormParser])
+@idempotent
 def upload_business_documents(request):
     """Upload documents for business verification"""
     
@@ -58,34 +74,76 @@ def upload_business_documents(request):
         context={'business_profile': business_profile}
     )
     
+    # Files dropped while streaming (bad format / too large) never reach the serializer
+    upload_errors = get_upload_errors(request)
+    if upload_errors:
+        return Response(upload_errors, status=status.HTTP_400_BAD_REQUEST)
+    
     if serializer.is_valid():
         document = serializer.save()
-        
-        # Update business status to under_review if it was pending
-        if business_profile.verification_status == 'pending':
-            business_profile.verification_status = 'under_review'
-            business_profile.save()
+        document_stored(business_profile, document)
         
         return Response({
             'message': 'Document uploaded successfully',
             'document_id': document.id,
             'document_type': document.document_type,
+            'validation_status': document.validation_status,
+            'validation_notes': document.validation_notes,
             'business_status': business_profile.verification_status
         }, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-def get_verification_status(request):
-    """Get the verification status of the user's business"""
+@idempotent
+def create_document_upload_url(request):
+    """Issue a short-lived signed URL for uploading one document outside the API workers"""
     
     try:
         business_profile = request.user.businessprofile
     except BusinessProfile.DoesNotExist:
+        return Response({
+            'error': 'No business profile found. Please register your business first.'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if business_profile.verification_status == 'approved':
+        return Response({
+            'error': 'Business is already verified. No additional documents needed.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Only ASGI workers mount the upload handler, a URL issued elsewhere would 404
+    if not direct_uploads_enabled():
+        return Response({
+            'error': 'Direct uploads are not available on this server. Use business/upload-documents/ instead.'
+        }, status=status.HTTP_501_NOT_IMPLEMENTED)
+    
+    serializer = DirectUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    token = create_upload_token(business_profile, **serializer.validated_data)
+    limits = get_upload_limits(serializer.validated_data['document_type'])
+    return Response({
+        'upload_url': upload_url(request, token),
+        'method': 'PUT',
+        'expires_in': settings.DIRECT_UPLOAD_URL_TTL,
+        'max_size': limits['max_size'],
+        'formats': limits['formats']
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_verification_status(request):
+    """Get the verification status of the user's business"""
+    
+    # Status polls are frequent, read the profile through the two-tier cache
+    business_profile = business_profile_cache.get_instance(request.user.id)
+    if business_profile is None:
         return Response({
             'error': 'No business profile found'
         }, status=status.HTTP_404_NOT_FOUND)
+    business_profile.user = request.user
     
     serializer = BusinessProfileSerializer(business_profile)
     
@@ -97,6 +155,80 @@ def get_verification_status(request):
         'verified_documents': business_profile.verified_documents
     }, status=status.HTTP_200_OK)
 
+# Public endpoints
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def business_directory(request):
+    """Browse approved businesses, optionally by business_type (cursor paginated)"""
+    
+    business_type = request.query_params.get('business_type')
+    if business_type and business_type not in dict(BusinessProfile.BUSINESS_TYPES):
+        return Response({
+            'error': 'Invalid business type'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        page_size = int(request.query_params.get('page_size', settings.DIRECTORY_PAGE_SIZE))
+    except ValueError:
+        page_size = 0
+    if not 1 <= page_size <= settings.DIRECTORY_MAX_PAGE_SIZE:
+        return Response({
+            'error': f'page_size must be between 1 and {settings.DIRECTORY_MAX_PAGE_SIZE}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    cursor = request.query_params.get('cursor')
+    position = None
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return Response({
+                'error': 'Invalid cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    cache = caches[settings.DIRECTORY_CACHE]
+    cache_key = page_cache_key(business_type, position, page_size)
+    data = cache.get(cache_key)
+    
+    if data is None:
+        businesses, has_more = directory_page(business_type, position, page_size)
+        data = {
+            'results': PublicBusinessSerializer(businesses, many=True).data,
+            'next_cursor': encode_cursor(businesses[-1]) if has_more else None
+        }
+        cache.set(cache_key, data, settings.DIRECTORY_CACHE_TTL)
+    
+    return Response(data, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def vendor_map_tile(request, zoom, x, y):
+    """Clustered counts of approved businesses inside one z/x/y map tile"""
+    
+    if zoom > settings.MAP_TILE_MAX_ZOOM or x >= 2 ** zoom or y >= 2 ** zoom:
+        return Response({
+            'error': 'Tile out of range'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    business_type = request.query_params.get('business_type')
+    if business_type and business_type not in dict(BusinessProfile.BUSINESS_TYPES):
+        return Response({
+            'error': 'Invalid business type'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    split = request.query_params.get('split') in ('true', '1')
+    
+    response = Response({
+        'zoom': zoom,
+        'x': x,
+        'y': y,
+        'cells': tile_cells(zoom, x, y, business_type, split)
+    }, status=status.HTTP_200_OK)
+    response['Cache-Control'] = f'public, max-age={settings.MAP_TILE_CACHE_SECONDS}'
+    return response
+
 # Additional utility views for admin/staff
 
 @api_view(['GET'])
@@ -122,6 +254,7 @@ def list_pending_businesses(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent
 def update_verification_status(request, business_id):
     """Update verification status of a business (Admin only)"""
     
@@ -132,6 +265,11 @@ def update_verification_status(request, business_id):
     
     business_profile = get_object_or_404(BusinessProfile, id=business_id)
     
+    if is_leased_to_other(business_profile, request.user):
+        return Response({
+            'error': 'Business is claimed by another reviewer'
+        }, status=status.HTTP_409_CONFLICT)
+    
     new_status = request.data.get('verification_status')
     notes = request.data.get('verification_notes', '')
     
@@ -140,6 +278,7 @@ def update_verification_status(request, business_id):
             'error': 'Invalid verification status'
         }, status=status.HTTP_400_BAD_REQUEST)
     
+    status_changed = business_profile.verification_status != new_status
     business_profile.verification_status = new_status
     business_profile.verification_notes = notes
     
@@ -148,10 +287,190 @@ def update_verification_status(request, business_id):
         business_profile.verified_at = timezone.now()
         business_profile.verified_by = request.user
     
-    business_profile.save()
+    # The review is done, hand the lease back
+    business_profile.review_claimed_by = None
+    business_profile.review_lease_expires_at = None
+    
+    # The outbox event commits or rolls back together with the status change
+    with transaction.atomic():
+        business_profile.save(update_fields=[
+            'verification_status', 'verification_notes', 'verified_at', 'verified_by',
+            'review_claimed_by', 'review_lease_expires_at', 'updated_at'
+        ])
+        # Saving only new notes is not a status change subscribers need to hear about
+        if status_changed:
+            record_status_events([business_profile])
     
     return Response({
         'message': f'Business verification status updated to {new_status}',
         'business_id': business_profile.id,
         'new_status': new_status
     }, status=status.HTTP_200_OK)
+
+# Reviewer work queue (Admin only)
+
+def _business_ids(request):
+    ids = request.data.get('business_ids')
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return None
+    return ids
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def claim_review_batch(request):
+    """Claim the next businesses to review with a time-limited lease (Admin only)"""
+    
+    if not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        count = int(request.data.get('count', 1))
+    except (TypeError, ValueError):
+        count = 0
+    if not 1 <= count <= settings.REVIEW_QUEUE_MAX_CLAIM:
+        return Response({
+            'error': f'count must be between 1 and {settings.REVIEW_QUEUE_MAX_CLAIM}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    ids, lease_expires_at = claim_businesses(request.user, count)
+    businesses = BusinessProfile.objects.filter(id__in=ids).order_by('created_at').select_related('user').prefetch_related('documents')
+    serializer = BusinessProfileSerializer(businesses, many=True)
+    
+    return Response({
+        'businesses': serializer.data,
+        'lease_expires_at': lease_expires_at,
+        'count': len(ids)
+    }, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def renew_review_leases(request):
+    """Extend leases held by the current reviewer (Admin only)"""
+    
+    if not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    business_ids = _business_ids(request)
+    if business_ids is None:
+        return Response({
+            'error': 'business_ids must be a list of business ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    renewed, lease_expires_at = renew_leases(request.user, business_ids)
+    
+    return Response({
+        'renewed': renewed,
+        'expired': sorted(set(business_ids) - set(renewed)),
+        'lease_expires_at': lease_expires_at
+    }, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def release_review_leases(request):
+    """Return claimed businesses to the queue without reviewing them (Admin only)"""
+    
+    if not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    business_ids = _business_ids(request)
+    if business_ids is None:
+        return Response({
+            'error': 'business_ids must be a list of business ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    released = release_leases(request.user, business_ids)
+    
+    return Response({
+        'released': released
+    }, status=status.HTTP_200_OK)
+
+# Document review (Admin only)
+
+def _review_params(request):
+    """Validate decision/reason/auto_approve; returns (params, error response)"""
+    decision = request.data.get('decision')
+    reason = request.data.get('reason', '')
+    
+    if decision not in DECISIONS:
+        return None, Response({
+            'error': f"decision must be one of: {', '.join(DECISIONS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if decision == 'rejected' and not reason:
+        return None, Response({
+            'error': 'A reason is required when rejecting a document'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    auto_approve = request.data.get('auto_approve', False) in (True, 'true', '1', 1)
+    return (decision, reason, auto_approve), None
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def review_document(request, document_id):
+    """Mark a single document verified or rejected (Admin only)"""
+    
+    if not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    document = get_object_or_404(BusinessDocument, id=document_id)
+    
+    params, error = _review_params(request)
+    if error:
+        return error
+    decision, reason, auto_approve = params
+    
+    _, approved_ids = review_documents(request.user, [document.id], decision, reason, auto_approve)
+    
+    return Response({
+        'message': f'Document marked as {decision}',
+        'document_id': document.id,
+        'review_status': decision,
+        'approved_businesses': approved_ids
+    }, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def bulk_review_documents(request):
+    """Mark many documents verified or rejected in one update (Admin only)"""
+    
+    if not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    document_ids = request.data.get('document_ids')
+    if not isinstance(document_ids, list) or not all(isinstance(i, int) for i in document_ids):
+        return Response({
+            'error': 'document_ids must be a list of document ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not 1 <= len(document_ids) <= settings.DOCUMENT_REVIEW_MAX_BATCH:
+        return Response({
+            'error': f'Between 1 and {settings.DOCUMENT_REVIEW_MAX_BATCH} documents can be reviewed at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    params, error = _review_params(request)
+    if error:
+        return error
+    decision, reason, auto_approve = params
+    
+    updated, approved_ids = review_documents(request.user, document_ids, decision, reason, auto_approve)
+    
+    return Response({
+        'message': f'{updated} documents marked as {decision}',
+        'updated': updated,
+        'approved_businesses': approved_ids
+    }, status=status.HTTP_200_OK)
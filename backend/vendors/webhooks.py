@@ -0,0 +1,271 @@
+"""
+Webhook outbox for business verification status changes.
+
+record_status_events() writes the outbox rows inside the caller's transaction,
+so an event exists if and only if the status change committed. The dispatcher
+(`manage.py dispatch_webhooks`) later claims due deliveries, batches them per
+endpoint and POSTs them concurrently over pooled keep-alive connections.
+Each request is signed with HMAC-SHA256 of "<timestamp>.<body>" using the
+endpoint secret. Failed batches are retried with exponential backoff.
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import BusinessProfile, WebhookDelivery, WebhookEndpoint, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+STATUS_EVENTS = {
+    'approved': 'business.approved',
+    'rejected': 'business.rejected',
+}
+
+
+def business_payload(business_profile):
+    return {
+        'business_id': business_profile.id,
+        'user_id': business_profile.user_id,
+        'business_name': business_profile.business_name,
+        'business_type': business_profile.business_type,
+        'verification_status': business_profile.verification_status,
+        'verification_notes': business_profile.verification_notes,
+        'verified_at': business_profile.verified_at,
+    }
+
+
+def record_status_events(businesses):
+    """Queue events for businesses whose new status is approved/rejected; call inside the status change transaction"""
+    events = [
+        WebhookEvent(
+            event_type=STATUS_EVENTS[business.verification_status],
+            payload=json.loads(json.dumps(business_payload(business), cls=DjangoJSONEncoder)),
+        )
+        for business in businesses
+        if business.verification_status in STATUS_EVENTS
+    ]
+    if not events:
+        return []
+
+    endpoints = list(WebhookEndpoint.objects.filter(is_active=True).values_list('id', flat=True))
+    events = WebhookEvent.objects.bulk_create(events)
+    WebhookDelivery.objects.bulk_create([
+        WebhookDelivery(event=event, endpoint_id=endpoint_id)
+        for event in events
+        for endpoint_id in endpoints
+    ])
+    return events
+
+
+def record_status_events_for(business_ids):
+    """Same as record_status_events, for businesses changed by a bulk UPDATE"""
+    return record_status_events(BusinessProfile.objects.filter(id__in=business_ids).order_by('id'))
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections, per scheme/host/port"""
+
+    def __init__(self, max_idle_per_host=4, timeout=10):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, host, port):
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.timeout)
+
+    def post(self, url, body, headers):
+        """POST body to url; returns (status code, response body)"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise http.client.InvalidURL(f'Unsupported webhook URL {url!r}')
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+
+        with self._lock:
+            idle = self._idle[key]
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+
+        while True:
+            if conn is None:
+                conn = self._connect(*key)
+            try:
+                conn.request('POST', path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection, retry once on a fresh one
+                conn, reused = None, False
+                continue
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                raise
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                idle = self._idle[key]
+                if len(idle) < self.max_idle_per_host:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+        return response.status, data
+
+    def close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for conn in connections:
+                    conn.close()
+            self._idle.clear()
+
+
+def sign(secret, timestamp, body):
+    message = f'{timestamp}.'.encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at WEBHOOK_RETRY_MAX_SECONDS"""
+    delay = min(settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.WEBHOOK_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_due_deliveries(limit):
+    """Lease due deliveries so concurrent dispatchers do not send them twice"""
+    now = timezone.now()
+    due = WebhookDelivery.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:limit])
+        WebhookDelivery.objects.filter(id__in=ids).update(
+            next_attempt_at=now + timezone.timedelta(seconds=settings.WEBHOOK_CLAIM_SECONDS)
+        )
+    return list(
+        WebhookDelivery.objects.filter(id__in=ids).select_related('event', 'endpoint').order_by('event_id')
+    )
+
+
+def _send_batch(pool, endpoint, deliveries):
+    """Runs in a worker thread; no database access here"""
+    body = json.dumps({
+        'events': [
+            {
+                'id': delivery.event.id,
+                'type': delivery.event.event_type,
+                'created_at': delivery.event.created_at.isoformat(),
+                'data': delivery.event.payload,
+            }
+            for delivery in deliveries
+        ]
+    }).encode()
+    timestamp = str(int(time.time()))
+    headers = {
+        'Content-Type': 'application/json',
+        'X-ODA-Timestamp': timestamp,
+        'X-ODA-Signature': f'sha256={sign(endpoint.secret, timestamp, body)}',
+    }
+    try:
+        status_code, _ = pool.post(endpoint.url, body, headers)
+    except (http.client.HTTPException, OSError, ValueError) as e:
+        # ValueError: a malformed URL, e.g. a port out of range; it only fails this endpoint's batch
+        return f'{type(e).__name__}: {e}'
+    if 200 <= status_code < 300:
+        return None
+    return f'HTTP {status_code}'
+
+
+def _record_result(deliveries, error):
+    now = timezone.now()
+    ids = [delivery.id for delivery in deliveries]
+    if error is None:
+        WebhookDelivery.objects.filter(id__in=ids).update(status='delivered', delivered_at=now, last_error='')
+        return
+    # Deliveries in a batch usually share their attempt count, so this is one UPDATE per batch
+    by_attempts = defaultdict(list)
+    for delivery in deliveries:
+        by_attempts[delivery.attempts + 1].append(delivery.id)
+    for attempts, attempt_ids in by_attempts.items():
+        gave_up = attempts >= settings.WEBHOOK_MAX_ATTEMPTS
+        WebhookDelivery.objects.filter(id__in=attempt_ids).update(
+            attempts=attempts,
+            status='failed' if gave_up else 'pending',
+            next_attempt_at=now + timezone.timedelta(seconds=retry_delay(attempts)),
+            last_error=error,
+        )
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            max_idle_per_host=settings.WEBHOOK_MAX_CONCURRENCY,
+            timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+        )
+    return _pool
+
+
+def dispatch_pending(limit=None):
+    """Deliver one round of due events; returns (delivered, failed) delivery counts"""
+    deliveries = claim_due_deliveries(limit or settings.WEBHOOK_DISPATCH_LIMIT)
+    if not deliveries:
+        return 0, 0
+
+    by_endpoint = defaultdict(list)
+    for delivery in deliveries:
+        by_endpoint[delivery.endpoint_id].append(delivery)
+
+    batches = []
+    for endpoint_deliveries in by_endpoint.values():
+        for start in range(0, len(endpoint_deliveries), settings.WEBHOOK_BATCH_SIZE):
+            batches.append(endpoint_deliveries[start:start + settings.WEBHOOK_BATCH_SIZE])
+
+    pool = get_pool()
+    with ThreadPoolExecutor(max_workers=settings.WEBHOOK_MAX_CONCURRENCY) as executor:
+        futures = [
+            (batch, executor.submit(_send_batch, pool, batch[0].endpoint, batch))
+            for batch in batches
+        ]
+        results = []
+        for batch, future in futures:
+            try:
+                results.append((batch, future.result()))
+            except Exception as e:
+                # One broken endpoint must not abort the round for every other subscriber
+                logger.exception(f"Webhook batch to {batch[0].endpoint.url} raised")
+                results.append((batch, f'{type(e).__name__}: {e}'))
+
+    delivered = failed = 0
+    for batch, error in results:
+        _record_result(batch, error)
+        if error is None:
+            delivered += len(batch)
+        else:
+            failed += len(batch)
+            logger.warning(f"Webhook batch to {batch[0].endpoint.url} failed: {error}")
+    return delivered, failed